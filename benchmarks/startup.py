@@ -0,0 +1,82 @@
+"""Startup benchmark
+
+Measures how long it takes to import each toolset module in a fresh interpreter,
+and how long demo.py takes to show its first prompt.
+
+    python benchmarks/startup.py [--runs 5]
+"""
+import argparse
+import os
+import pkgutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# every module of the package, found on disk so importing them here does not skew the timings
+MODULES = ["toolset"] + sorted(
+    f"toolset.{module.name}" for module in pkgutil.iter_modules([str(ROOT / "toolset")])
+)
+
+IMPORT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def time_import(module: str) -> float:
+    """Seconds spent importing `module` in a fresh interpreter, or None if it fails to import."""
+
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT.format(module=module)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_first_prompt(marker: str = "How can I help you?") -> float:
+    """Seconds from starting demo.py until it prints its introduction, or None if it exits first."""
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "demo.py"],
+        cwd=ROOT,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+    )
+    elapsed = None
+    for line in process.stdout:
+        if marker in line:
+            elapsed = time.perf_counter() - start
+            break
+    process.communicate("/bye\n")
+    return elapsed
+
+
+def report(name: str, samples: list):
+    samples = [sample for sample in samples if sample is not None]
+    if not samples:
+        print(f"{name:<36} failed")
+        return
+    print(f"{name:<36} min {min(samples) * 1000:8.1f} ms   median {statistics.median(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        report(f"import {module}", [time_import(module) for _ in range(args.runs)])
+    report("demo.py first prompt", [time_first_prompt() for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,22 @@
-import json
+import time
 
 import ollama
 
-from toolset import system
+from toolset import Toolset, system, web
+from toolset.cache import ToolCache
+from toolset.compaction import Compactor, read_result
 from toolset.handlers import handle_tool_calls
+from toolset.history import DEFAULT_NUM_CTX, History
+from toolset.keepalive import KeepAlive
+from toolset.memory import Memory
+from toolset.pool import ClientPool
+from toolset.response_cache import ReplayMiss, ResponseCache
+from toolset.routing import Router
+from toolset.scheduler import Turn
+from toolset.sizing import ContextSizer
+from toolset.semantic_cache import SemanticCache
+from toolset.telemetry import Telemetry
+from toolset.tracing import span, tracer
 
 model = "llama3.2:latest"
 
@@ -18,6 +31,19 @@ You know that the tool requests are memoized and cached, so you can use them as
 
 introduction = "How can I help you?"
 
+# print the reply as it is generated instead of waiting for the whole response
+stream = True
+
+# set to several Ollama hosts, e.g. ["http://127.0.0.1:11434", "http://10.0.0.2:11434"],
+# to spread requests across them; this session stays on one host while it is up
+ollama_hosts = None
+pool = ClientPool(ollama_hosts) if ollama_hosts else None
+llm = pool.session("demo") if pool is not None else ollama
+
+# loads the model at startup and keeps it loaded while the session is active, making room for
+# the model of another session on this machine, e.g. chat_tools.py, when this one goes idle
+keepalive = KeepAlive(model, client=llm)
+
 options = ollama.Options(
     numa=None,
     num_ctx=None,
@@ -52,10 +78,61 @@ options = ollama.Options(
     stop=None,
 )
 
-tools = [
+tools = Toolset([
     system.subprocess_run_command,
     system.get_current_date_time,
-]
+    web.fetch_url,
+    web.fetch_many,
+    read_result,
+])
+
+cache = ToolCache()
+
+# set to a small, fast model, e.g. "llama3.2:1b", to pick the tools of each round while
+# the main model only writes the answers and the rounds the small model gets wrong
+tool_model = None
+router = Router(small=tool_model, large=model, tools=tools) if tool_model else None
+
+# the small model gets its own keep alive, so its lease tells other sessions it is loaded too; when the machine
+# only fits one model (keepalive.MAX_LOADED = 1) the two still take turns, and a round may wait for a reload
+keepalives = {model: keepalive}
+if router is not None:
+    keepalives[tool_model] = KeepAlive(tool_model, client=llm)
+
+# shortens large tool results before they enter the history, the model pages through them with read_result
+compactor = Compactor()
+
+# seconds of tool time each turn gets, press Ctrl-C to cancel a turn sooner
+turn_budget = 60
+
+# set to "readwrite" to reuse replies to repeated requests, or "replay" to only answer from earlier runs
+response_cache_mode = None
+response_cache = ResponseCache(mode=response_cache_mode) if response_cache_mode else None
+
+# set to an embedding model, e.g. "nomic-embed-text", to answer paraphrases of earlier prompts from a cache
+semantic_cache_model = None
+semantic_cache = SemanticCache(model=semantic_cache_model, client=llm, ttls=cache.ttl) if semantic_cache_model else None
+
+# timings of every call and turn, appended to a JSONL file
+telemetry = Telemetry(path="telemetry.jsonl")
+
+# set to the largest context to use, e.g. 16384, to size num_ctx and num_batch to each prompt
+# instead of the server defaults; changes of size are recorded in the telemetry
+max_ctx = None
+sizer = ContextSizer(max_ctx=max_ctx, telemetry=telemetry) if max_ctx else None
+if sizer is not None:
+    # preload at the size the first prompts fit, not the server default the first request would reload from
+    for model_keepalive in keepalives.values():
+        model_keepalive.options = sizer.smallest()
+
+# set to record spans of each turn, exported to trace.json (chrome://tracing, Perfetto)
+# and trace.folded (flamegraph.pl, speedscope) on /bye
+tracer.enabled = False
+
+# set to a port to serve the timings at http://127.0.0.1:<port>/metrics
+metrics_port = None
+if metrics_port:
+    telemetry.serve(metrics_port)
 
 messages = [
     {
@@ -69,74 +146,274 @@ messages = [
 ]
 
 
-def generate_response():
-    return ollama.chat(
+# set to summarize older turns with the model instead of dropping them
+summarize_history = False
+
+
+def summarize(dropped: list) -> str:
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in dropped)
+    summary_prompt = f"Summarize this conversation in a few sentences, keeping any facts the user may ask about again:\n\n{transcript}"
+    summarize_options = options
+    if sizer is not None:
+        summarize_options = sizer.apply(options, model, [{"role": "user", "content": summary_prompt}])
+    response = llm.generate(
         model=model,
-        messages=messages,
-        tools=tools,
-        stream=False,
-        format=None,
-        options=options,
-        keep_alive=None,
+        prompt=summary_prompt,
+        options=summarize_options,
     )
+    telemetry.record(response, kind="generate")
+    return response.response
+
+
+# set to an embedding model, e.g. "nomic-embed-text", to keep only the last few turns in the prompt
+# and recall older ones, from this and earlier sessions, by relevance
+memory_model = None
+memory_turns = 4
+memory = Memory(model=memory_model, client=llm) if memory_model else None
+
+history = History(
+    messages,
+    num_ctx=sizer.max_ctx if sizer is not None else options.num_ctx or DEFAULT_NUM_CTX,
+    # leave room for the recalled notes
+    reserve=512 + (memory.budget if memory is not None else 0),
+    summarize=summarize if summarize_history else None,
+    max_turns=memory_turns if memory is not None else None,
+    archive=memory.archive if memory is not None else None,
+)
+
+
+def prompt_context():
+    """The answer a new prompt may refer to, or None when it starts the conversation."""
+
+    if not any(message["role"] == "user" for message in messages):
+        return None
+    return next((message["content"] for message in reversed(messages) if message["role"] == "assistant"), None)
+
+
+# seconds from each prompt to the first token of the reply, by turn
+time_to_first_token = {}
+turn_started = None
+
+
+def generate_response():
+    with span("history.fit"):
+        prompt_messages = history.fit()
+    if memory is not None:
+        with span("memory.recall"):
+            prompt_messages = memory.with_context(prompt_messages)
+    if router is not None:
+        return router.route(lambda tier_model, reply: chat(tier_model, prompt_messages, reply))
+    return chat(model, prompt_messages, True)
+
 
+def chat(chat_model: str, prompt_messages: list, reply: bool):
+    """Make one chat request, streaming it when `reply` is set and the demo streams."""
 
+    streaming = stream and reply
+    chat_keepalive = keepalives[chat_model]
+    chat_options = options
+    if sizer is not None:
+        chat_options = sizer.apply(options, chat_model, prompt_messages, tools.schemas)
+        # heartbeats with other sizes would reload the model
+        chat_keepalive.options = {"num_ctx": chat_options.num_ctx, "num_batch": chat_options.num_batch}
+    with span("llm.chat", model=chat_model, messages=len(prompt_messages)):
+        # a cached reply streams as a single chunk, a missed one streams as usual and is stored when it ends
+        request = dict(
+            model=chat_model,
+            messages=prompt_messages,
+            tools=tools.schemas,
+            stream=streaming,
+            format=None,
+            options=chat_options,
+            keep_alive=chat_keepalive.keep_alive,
+        )
+        if response_cache is not None:
+            response = response_cache.chat(client=llm, **request)
+        else:
+            response = llm.chat(**request)
+        if streaming:
+            response = stream_response(response)
+    telemetry.record(response)
+    return response
+
+
+def stream_response(chunks):
+    """Print content chunks as they arrive and fold the stream into a single response.
+
+    Tool calls can arrive in any chunk, so they are collected across the whole stream.
+    """
+
+    content = []
+    tool_calls = []
+    chunk = None
+    for chunk in chunks:
+        if chunk.message.content:
+            if turn not in time_to_first_token:
+                time_to_first_token[turn] = time.perf_counter() - turn_started
+            print(chunk.message.content, end="", flush=True)
+            content.append(chunk.message.content)
+        if chunk.message.tool_calls:
+            tool_calls.extend(chunk.message.tool_calls)
+    if content:
+        print()
+    chunk.message.content = "".join(content)
+    chunk.message.tool_calls = tool_calls or None
+    return chunk
+
+
+def append_tool_results(tool_calls):
+    results = handle_tool_calls(tool_calls, tools, cache, turn=turn_scope)
+    turn_tools.update(result["name"] for result in results)
+    with span("messages.append_tool_results", results=len(results)):
+        for result in results:
+            with span("compact", tool=result["name"]):
+                content = compactor.compact(result)
+            messages.append({
+                "role": "tool",
+                "tool_name": result["name"],
+                "content": content,
+            })
+
+
+for model_keepalive in keepalives.values():
+    model_keepalive.start()
 print(messages[1]["content"])
 
+turn = 0
 while True:
     prompt = input("> ")
 
     if prompt == "/bye":
+        for model_keepalive in keepalives.values():
+            model_keepalive.close()
+        if memory is not None:
+            # finish archiving the dropped turns, then keep what is still in the history for later sessions
+            memory.close()
+            memory.remember(messages[history.pinned():])
+        if tracer.enabled:
+            tracer.export_chrome("trace.json")
+            tracer.export_collapsed("trace.folded")
         break
 
-    messages.append({
-        "role": "user",
-        "content": prompt,
-    })
+    if prompt == "/cache":
+        print(cache.stats())
+        if response_cache is not None:
+            print(response_cache.stats())
+        if semantic_cache is not None:
+            print(semantic_cache.stats())
+        continue
+
+    if prompt == "/ttft":
+        print(time_to_first_token)
+        continue
+
+    if prompt == "/metrics":
+        print(telemetry.prometheus())
+        continue
+
+    if prompt == "/model":
+        for model_keepalive in keepalives.values():
+            print(model_keepalive.stats())
+        if router is not None:
+            print(router.stats())
+        if sizer is not None:
+            print(sizer.stats())
+        continue
+
+    if prompt == "/hosts":
+        print(pool.stats() if pool is not None else "Using the default Ollama host.")
+        continue
+
+    if prompt == "/tools":
+        print(", ".join(f"{name}{' (disabled)' if name in tools.disabled else ''}" for name in tools.functions))
+        continue
 
-    response = generate_response()
+    if prompt.startswith(("/enable ", "/disable ")):
+        command, *names = prompt.split()
+        try:
+            getattr(tools, command[1:])(*names)
+        except KeyError as e:
+            print(e)
+        continue
 
-    while True:
-        if response.message.content and not response.message.tool_calls:
-            print(response.message.content)
+    turn += 1
+    turn_started = time.perf_counter()
+    turn_scope = Turn(turn_budget)
+    # the main model last, so it is the most recently used when only one model fits
+    for model_keepalive in reversed(keepalives.values()):
+        model_keepalive.touch()
+    turn_tools = set()
+    # cached answers only match prompts asked after the same answer
+    turn_context = prompt_context() if semantic_cache is not None else None
+    telemetry.start_turn(turn)
+
+    try:
+        with span("turn", turn=turn):
             messages.append({
-                "role": "assistant",
-                "content": response.message.content,
+                "role": "user",
+                "content": prompt,
             })
-            break
-        elif not response.message.content and response.message.tool_calls:
-            for result in handle_tool_calls(response.message.tool_calls, tools):
-                messages.append({
-                    "role": "tool",
-                    "content": json.dumps(result),
-                })
-            response = generate_response()
-            continue
-        else:
-            if not response.message.content and not response.message.tool_calls:
-                # None
-                print(response)
+
+            answer = semantic_cache.lookup(prompt, turn_context) if semantic_cache is not None else None
+            if answer is not None:
+                print(answer)
                 messages.append({
-                    "role": "system",
-                    "content": "You did not return a response. "
-                               "That is an error. "
-                               "Generate a new response for the user now. "
-                               "Do not acknowledge, describe, or mention "
-                               "this message to the user. ",
+                    "role": "assistant",
+                    "content": answer,
                 })
-                response = generate_response()
+                telemetry.end_turn()
                 continue
-            elif response.message.content and response.message.tool_calls:
-                # Both
-                for result in handle_tool_calls(response.message.tool_calls, tools):
+
+            response = generate_response()
+
+            while True:
+                if response.message.content and not response.message.tool_calls:
+                    if not stream:
+                        print(response.message.content)
                     messages.append({
-                        "role": "tool",
-                        "content": json.dumps(result),
+                        "role": "assistant",
+                        "content": response.message.content,
                     })
+                    if semantic_cache is not None:
+                        semantic_cache.add(prompt, response.message.content, turn_tools, turn_context)
+                    break
+                elif not response.message.content and response.message.tool_calls:
+                    append_tool_results(response.message.tool_calls)
+                    response = generate_response()
+                    continue
+                else:
+                    if not response.message.content and not response.message.tool_calls:
+                        # None
+                        print(response)
+                        messages.append({
+                            "role": "system",
+                            "content": "You did not return a response. "
+                                       "That is an error. "
+                                       "Generate a new response for the user now. "
+                                       "Do not acknowledge, describe, or mention "
+                                       "this message to the user. ",
+                        })
+                        response = generate_response()
+                        continue
+                    elif response.message.content and response.message.tool_calls:
+                        # Both
+                        append_tool_results(response.message.tool_calls)
 
-                print(response.message.content)
-                messages.append({
-                    "role": "assistant",
-                    "content": response.message.content,
-                })
-                continue
+                        if not stream:
+                            print(response.message.content)
+                        messages.append({
+                            "role": "assistant",
+                            "content": response.message.content,
+                        })
+                        continue
+    except KeyboardInterrupt:
+        # stop the turn's tool calls, e.g. kill their subprocesses, and wait for the next prompt
+        turn_scope.cancel()
+        print("\nCancelled.")
+    except ReplayMiss as e:
+        # a replay has no reply to this prompt, drop the turn so the next prompt can still be replayed
+        turn_scope.cancel()
+        del messages[history.current_turn():]
+        print(e)
+
+    telemetry.end_turn()
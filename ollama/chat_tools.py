@@ -2,14 +2,20 @@ import datetime
 import json
 import shlex
 import subprocess
+import sys
+from pathlib import Path
 from typing import Optional, Union, Literal, Sequence, Any, Mapping, Callable
 
 import ollama
 from ollama import Message, Tool, Options
 from pydantic.json_schema import JsonSchemaValue
-from requests_html import HTMLSession
 
-session = HTMLSession()
+# scripts in this directory are run directly, so make the toolset package importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from toolset.history import DEFAULT_NUM_CTX, History
+from toolset.keepalive import KEEP_ALIVE, KeepAlive
+from toolset.web import fetch_url
 
 
 def get_current_time(*args, **kwargs) -> str:
@@ -37,11 +43,7 @@ def subtract(x: int, y: int) -> int:
 
 def web_request(url: str) -> str:
     # What is the latest version of Python available for download?
-    # TODO: cache
-    print(f"Requesting {url}")
-    res = session.get(url)
-    res.raise_for_status()
-    return res.html.text
+    return fetch_url(url)
 
 
 def handle_tool_calls(tool_calls) -> list:
@@ -94,14 +96,14 @@ tools: Optional[Sequence[Union[Mapping[str, Any], Tool, Callable]]] = [
         "type": "function",
         "function": {
             "name": "web_request",
-            "description": "Submit a GET request using the Python requests library by providing a URL as a string. You will get the raw HTML for the webpage as a string.",
+            "description": "Submit a GET request by providing a URL as a string. You will get the readable text of the webpage as a string.",
             "parameters": {
                 "type": "object",
                 "required": ["url"],
                 "properties": {
                     "url": {
                         "type": "string",
-                        "description": "The URL of the webpage to request the HTML for.",
+                        "description": "The URL of the webpage to request the text for.",
                     },
                 }
             }
@@ -190,14 +192,24 @@ messages = [
     }
 ]
 
+history = History(messages, num_ctx=options.num_ctx or DEFAULT_NUM_CTX)
+
+# loads the model at startup and keeps it loaded while the session is active,
+# taking turns with demo.py's model when both do not fit at once
+keepalive = KeepAlive(model, keep_alive=keep_alive or KEEP_ALIVE)
+keepalive.start()
+
 print(messages[1]["content"])
 
 while True:
     prompt = input("> ")
 
     if prompt == "q":
+        keepalive.close()
         break
 
+    keepalive.touch()
+
     messages.append({
         "role": "user",
         "content": prompt,
@@ -205,9 +217,10 @@ while True:
 
     response = ollama.chat(
         model=model,
-        messages=messages,
+        messages=history.fit(),
         options=options,
         tools=tools,
+        keep_alive=keepalive.keep_alive,
     )
 
     while True:
@@ -225,9 +238,10 @@ while True:
                 })
             response = ollama.chat(
                 model=model,
-                messages=messages,
+                messages=history.fit(),
                 options=options,
                 tools=tools,
+                keep_alive=keepalive.keep_alive,
             )
             continue
         elif response.message.content and response.message.tool_calls:
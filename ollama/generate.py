@@ -2,11 +2,20 @@
 
 https://github.com/ollama/ollama/blob/main/docs/api.md
 """
+import sys
+from pathlib import Path
 from typing import Optional, Union, Literal, Sequence, Any, Mapping
 
 from ollama import generate, Options
 from pydantic.json_schema import JsonSchemaValue
 
+# scripts in this directory are run directly, so make the toolset package importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from toolset.batch import run_batch
+from toolset.response_cache import ResponseCache
+from toolset.telemetry import Telemetry
+
 # (required) the model name
 model: str = "gemma3:4b"
 
@@ -46,7 +55,55 @@ options: Optional[Union[Mapping[str, Any], Options]] = None
 # controls how long the model will stay loaded into memory following the request (default: 5m)
 keep_alive: Optional[Union[float, str]] = None
 
-response = generate(
+# reuses responses to repeated deterministic requests, e.g. ResponseCache() or ResponseCache(mode="replay")
+response_cache: Optional[ResponseCache] = None
+
+# records the timings of each response, e.g. to a JSONL file with Telemetry(path="telemetry.jsonl")
+telemetry = Telemetry()
+
+# a JSONL file of prompts to run in a batch instead of the single prompt, one {"id": ..., "prompt": ...} per line,
+# with optional fields like "system" or "options" to override the settings above
+batch_input: Optional[str] = None
+
+# the JSONL file results are appended to, prompts already in it are skipped so a stopped batch can be rerun
+batch_output: str = "generate.results.jsonl"
+
+# prompts generated at once, set OLLAMA_NUM_PARALLEL on the server at least this high
+batch_concurrency: int = 4
+
+if batch_input:
+    summary = run_batch(
+        batch_input,
+        batch_output,
+        response_cache.generate if response_cache else generate,
+        defaults={
+            "model": model,
+            "suffix": suffix,
+            "system": system,
+            "template": template,
+            "raw": raw,
+            "format": format,
+            "options": options,
+            "keep_alive": keep_alive,
+        },
+        concurrency=batch_concurrency,
+        telemetry=telemetry,
+        progress=lambda summary: print(
+            f"\r{summary['done']} done, {summary['failed']} failed, {summary['skipped']} skipped, "
+            f"{summary['prompts_per_second']:.2f} prompts/s, {summary['eval_tokens_per_second']:.1f} tokens/s",
+            end="",
+            flush=True,
+        ),
+    )
+    print()
+    print(
+        f"{summary['done']} prompts in {summary['seconds']:.1f}s, {summary['prompts_per_second']:.2f} prompts/s, "
+        f"{summary['prompt_tokens']} prompt tokens, {summary['eval_tokens']} generated tokens "
+        f"at {summary['eval_tokens_per_second']:.1f}/s, {summary['failed']} failed, {summary['skipped']} skipped"
+    )
+    sys.exit(1 if summary["failed"] else 0)
+
+response = (response_cache.generate if response_cache else generate)(
     model=model,
     prompt="How are you?",
     suffix=suffix,
@@ -64,5 +121,11 @@ response = generate(
 text = response.response
 created_at = response.created_at
 total_duration = response.total_duration
+timings = telemetry.record(response, kind="generate")
 
 print(text)
+print(
+    f"load {timings['load_duration']:.2f}s ({'cold' if timings['cold'] else 'warm'}), "
+    f"prefill {timings['prompt_eval_count']} tokens at {timings['prefill_tokens_per_second']:.1f}/s, "
+    f"decode {timings['eval_count']} tokens at {timings['decode_tokens_per_second']:.1f}/s"
+)
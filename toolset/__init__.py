@@ -1,3 +1,68 @@
 class Toolset:
-    def __init__(self):
-        pass
+    """A registry of tools, with each tool's schema built once.
+
+    Passing callables to `ollama.chat` makes the client parse their docstrings
+    and signatures into schemas on every call. A Toolset does that once, when a
+    tool is registered, and keeps the schemas and the name to callable dispatch
+    table until the set of enabled tools changes.
+
+    Args:
+        tools: The callables to register.
+    """
+
+    def __init__(self, tools: list = ()):
+        self.functions = {}
+        self.disabled = set()
+        self._schemas = {}
+        self._enabled = None
+        for function in tools:
+            self.register(function)
+
+    def register(self, function, name: str = None):
+        from ollama._utils import convert_function_to_tool
+
+        name = name or function.__name__
+        schema = convert_function_to_tool(function)
+        schema.function.name = name
+        self.functions[name] = function
+        self._schemas[name] = schema
+        self._enabled = None
+
+    def enable(self, *names: str):
+        unknown = set(names) - set(self.functions)
+        if unknown:
+            raise KeyError(f"Unknown tools: {', '.join(sorted(unknown))}")
+        self.disabled.difference_update(names)
+        self._enabled = None
+
+    def disable(self, *names: str):
+        unknown = set(names) - set(self.functions)
+        if unknown:
+            raise KeyError(f"Unknown tools: {', '.join(sorted(unknown))}")
+        self.disabled.update(names)
+        self._enabled = None
+
+    def enabled(self) -> tuple:
+        """The enabled tools as a dispatch table and a list of schemas, rebuilt only after a change."""
+
+        if self._enabled is None:
+            names = [name for name in self.functions if name not in self.disabled]
+            self._enabled = (
+                {name: self.functions[name] for name in names},
+                [self._schemas[name] for name in names],
+            )
+        return self._enabled
+
+    @property
+    def dispatch(self) -> dict:
+        return self.enabled()[0]
+
+    @property
+    def schemas(self) -> list:
+        return self.enabled()[1]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.dispatch
+
+    def __len__(self) -> int:
+        return len(self.dispatch)
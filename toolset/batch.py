@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from toolset.telemetry import timings
+
+# prompts generated at once, the server needs OLLAMA_NUM_PARALLEL at least this high to run them in parallel
+CONCURRENCY = 4
+
+# fields of an input line that are passed on to generate
+REQUEST_FIELDS = ("model", "prompt", "suffix", "system", "template", "raw", "format", "images", "options")
+
+
+def completed(path: Path) -> set:
+    """The ids of the prompts with a result, not an error, in an output file."""
+
+    done = set()
+    if not path.exists():
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line of a run that crashed mid-write
+                continue
+            if "error" not in record:
+                done.add(record["id"])
+    return done
+
+
+def prompts(path: Path):
+    """Read prompts from a JSONL file a line at a time, using the line number as the id of lines without one."""
+
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                item = json.loads(line)
+                item.setdefault("id", number)
+                yield item
+
+
+def run_batch(input_path, output_path, generate, defaults: dict = None, concurrency: int = CONCURRENCY,
+              telemetry=None, progress=None) -> dict:
+    """Generate a response for every prompt in a JSONL file, writing each result as it finishes.
+
+    Each input line is an object with a `prompt`, an optional `id`, and optionally
+    any other generate field, e.g. `system` or `options`, to override `defaults`.
+    Each output line has the `id`, the `response` and its timings, or an `error`.
+    Prompts whose id already has a result in the output file are skipped, so an
+    interrupted run continues where it stopped, and failed prompts are retried.
+
+    Args:
+        input_path: The JSONL file of prompts.
+        output_path: The JSONL file results are appended to.
+        generate: The generate function to call, e.g. `ollama.generate` or `ResponseCache().generate`.
+        defaults: The generate arguments of every prompt, e.g. `model` and `options`.
+        concurrency: The prompts generated at once.
+        telemetry: An optional `Telemetry` to record each response to.
+        progress: An optional callable that is given the running summary after each result.
+
+    Returns:
+        dict: The number of prompts done, skipped, and failed, the elapsed seconds, and the throughput.
+    """
+
+    output_path = Path(output_path)
+    done = completed(output_path)
+    summary = {"done": 0, "skipped": 0, "failed": 0, "prompt_tokens": 0, "eval_tokens": 0}
+    lock = threading.Lock()
+    # bounds the prompts read ahead of the ones running, so the input is never loaded whole
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    started = time.perf_counter()
+
+    partial = False
+    if output_path.exists() and output_path.stat().st_size:
+        with open(output_path, "rb") as f:
+            f.seek(-1, 2)
+            partial = f.read(1) != b"\n"
+
+    with open(output_path, "a") as output:
+        if partial:
+            # end the partial line of a run that crashed mid-write
+            output.write("\n")
+
+        def write(record: dict):
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+
+        def run(item: dict):
+            request = {**(defaults or {}), **{key: item[key] for key in REQUEST_FIELDS if key in item}}
+            try:
+                response = generate(**request, stream=False)
+                record = {"id": item["id"], "response": response.response, **timings(response)}
+                if telemetry is not None:
+                    telemetry.record(response, kind="generate")
+            except Exception as e:
+                record = {"id": item["id"], "error": str(e) or type(e).__name__}
+            with lock:
+                write(record)
+                if "error" in record:
+                    summary["failed"] += 1
+                else:
+                    summary["done"] += 1
+                    summary["prompt_tokens"] += record["prompt_eval_count"]
+                    summary["eval_tokens"] += record["eval_count"]
+                if progress is not None:
+                    progress(throughput(summary, started))
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+            for item in prompts(input_path):
+                if item["id"] in done:
+                    with lock:
+                        summary["skipped"] += 1
+                    continue
+                slots.acquire()
+                future = executor.submit(run, item)
+                future.add_done_callback(lambda _: slots.release())
+
+    return throughput(summary, started)
+
+
+def throughput(summary: dict, started: float) -> dict:
+    elapsed = time.perf_counter() - started
+    return {
+        **summary,
+        "seconds": elapsed,
+        "prompts_per_second": summary["done"] / elapsed if elapsed else 0.0,
+        "eval_tokens_per_second": summary["eval_tokens"] / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a result stays valid, per tool. A TTL of 0 disables caching for that tool.
+DEFAULT_TTLS = {
+    "get_current_date_time": 0,
+    "subprocess_run_command": 30,
+    # already answered from the host sampler's snapshots, caching them again would double their age
+    "get_active_connections": 0,
+    "get_public_ip": 0,
+    "get_network_interfaces": 0,
+    "get_local_ip": 0,
+}
+
+
+def make_key(name: str, arguments: dict = None) -> str:
+    """Build a canonical cache key for a tool call.
+
+    Argument order and whitespace do not matter, so `{"a": 1, "b": 2}` and
+    `{"b": 2, "a": 1}` map to the same key.
+
+    Args:
+        name: The name of the tool.
+        arguments: The arguments the tool was called with.
+
+    Returns:
+        str: The cache key.
+    """
+
+    return json.dumps([name, arguments or {}], sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolCache:
+    """A thread-safe LRU cache of tool results with a TTL per tool.
+
+    Args:
+        ttls: A mapping of tool names to TTLs in seconds, merged over `DEFAULT_TTLS`.
+        default_ttl: The TTL for tools that are not listed in `ttls`.
+        maxsize: The maximum number of results to keep before evicting the least recently used.
+    """
+
+    def __init__(self, ttls: dict = None, default_ttl: float = 60, maxsize: int = 256):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl(self, name: str) -> float:
+        return self.ttls.get(name, self.default_ttl)
+
+    def cacheable(self, name: str) -> bool:
+        return self.ttl(name) > 0
+
+    def get(self, name: str, arguments: dict = None):
+        """Look up a cached result.
+
+        Returns:
+            tuple: `(True, result)` on a hit, `(False, None)` on a miss.
+        """
+
+        key = make_key(name, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, name: str, arguments: dict, result):
+        ttl = self.ttl(name)
+        if ttl <= 0:
+            return
+        key = make_key(name, arguments)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def call(self, name: str, function, arguments: dict = None):
+        """Return the cached result of a tool call, running the tool on a miss.
+
+        Args:
+            name: The name of the tool.
+            function: The callable that implements the tool.
+            arguments: The arguments to call the tool with.
+
+        Returns:
+            The result of the tool call.
+        """
+
+        if not self.cacheable(name):
+            return function(**arguments) if arguments else function()
+        # a forced refresh skips the cache and replaces the result of the same call without it
+        refresh = bool(arguments and arguments.get("refresh"))
+        key_arguments = {key: value for key, value in (arguments or {}).items() if key != "refresh"}
+        if not refresh:
+            hit, result = self.get(name, key_arguments)
+            if hit:
+                return result
+        result = function(**arguments) if arguments else function()
+        self.set(name, key_arguments, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+            }
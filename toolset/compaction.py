@@ -0,0 +1,239 @@
+import itertools
+import json
+import math
+import threading
+from collections import OrderedDict
+
+# tokens a tool result may take in the message history, per tool
+DEFAULT_BUDGETS = {
+    "fetch_url": 1500,
+    "fetch_many": 3000,
+    "subprocess_run_command": 1000,
+    "get_active_connections": 800,
+}
+
+DEFAULT_BUDGET = 500
+
+# characters per token, the same rough estimate the history uses
+CHARS_PER_TOKEN = 4
+
+# characters of a full result returned per page by read_result
+PAGE_CHARS = 4000
+
+# tools whose results are never shortened, a page of read_result is already bounded
+# and shortening it again would store it under a new handle the model can never read whole
+EXEMPT = {"read_result"}
+
+# lists with at most this many items are shrunk item by item instead of dropping items
+SHORT_LIST = 16
+
+# full results kept for paging, the least recently stored are dropped first
+MAX_STORED = 64
+
+
+def dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def fit(build, total: int, budget: int) -> int:
+    """Binary search for the most items, up to `total`, that `build(count)` keeps within the budget."""
+
+    low, high, best = 1, total, 0
+    while low <= high:
+        middle = (low + high) // 2
+        if len(dumps(build(middle))) <= budget:
+            best, low = middle, middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def shares(sizes: dict, budget: int) -> dict:
+    """Split a budget between keys, giving small values their full size and the rest an even share."""
+
+    allotted = {}
+    remaining = dict(sizes)
+    while remaining:
+        share = budget // len(remaining)
+        small = {key: size for key, size in remaining.items() if size <= share}
+        if not small:
+            return {**allotted, **{key: share for key in remaining}}
+        allotted.update(small)
+        budget -= sum(small.values())
+        for key in small:
+            del remaining[key]
+    return allotted
+
+
+def shrink(value, budget: int):
+    """Shrink a JSON value to roughly `budget` characters, keeping its structure.
+
+    Strings keep their start and end. Short lists keep every item, shrunk, and long
+    lists keep whole items from both ends, with a note of how many were left out. Dicts keep their small values whole and shrink
+    the large ones, dropping trailing keys only when there are too many to fit.
+
+    Args:
+        value: The value to shrink.
+        budget: The characters the serialized value should roughly fit in.
+
+    Returns:
+        The shrunk value.
+    """
+
+    if len(dumps(value)) <= budget:
+        return value
+
+    if isinstance(value, str):
+        keep = max(0, budget - 40) // 2
+        return f"{value[:keep]}...[{len(value) - 2 * keep} characters omitted]...{value[len(value) - keep:]}"
+
+    if isinstance(value, dict):
+        items = list(value.items())
+        # about 20 characters per key for its name and a shrunk value
+        if len(items) * 20 > budget:
+            def build(count):
+                return {**dict(items[:count]), "...": f"{len(items) - count} more keys"}
+
+            count = fit(build, len(items), budget)
+            return build(count) if count else {"...": f"{len(items)} keys"}
+
+        overhead = sum(len(dumps(key)) + 2 for key, _ in items)
+        allotted = shares({key: len(dumps(item)) for key, item in items}, max(0, budget - overhead))
+        return {key: shrink(item, allotted[key]) for key, item in items}
+
+    if isinstance(value, (list, tuple)):
+        # a short list, like one entry per fetched page, keeps every item and shrinks the large ones
+        if len(value) <= SHORT_LIST:
+            allotted = shares({i: len(dumps(item)) for i, item in enumerate(value)}, max(0, budget - len(value)))
+            return [shrink(item, allotted[i]) for i, item in enumerate(value)]
+
+        def build(count):
+            head = math.ceil(count / 2)
+            kept = list(value[:head]) + list(value[len(value) - (count - head):])
+            kept.insert(head, f"...[{len(value) - count} more items]...")
+            return kept
+
+        count = fit(build, len(value), budget)
+        if count:
+            return build(count)
+        return [shrink(value[0], budget - 40), f"...[{len(value) - 1} more items]..."]
+
+    return value
+
+
+class ResultStore:
+    """Keep full tool results that were compacted, so the model can page through them.
+
+    Args:
+        maxsize: The results kept before the least recently stored are dropped.
+    """
+
+    def __init__(self, maxsize: int = MAX_STORED):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def put(self, value) -> str:
+        with self._lock:
+            handle = f"r{next(self._ids)}"
+            self._results[handle] = dumps(value)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+            return handle
+
+    def pages(self, handle: str, page_chars: int = PAGE_CHARS) -> int:
+        with self._lock:
+            return max(1, math.ceil(len(self._results.get(handle, "")) / page_chars))
+
+    def page(self, handle: str, page: int = 1, page_chars: int = PAGE_CHARS) -> dict:
+        with self._lock:
+            text = self._results.get(handle)
+        if text is None:
+            return {"error": f"No stored result '{handle}', it may have expired."}
+        pages = max(1, math.ceil(len(text) / page_chars))
+        page = min(max(1, page), pages)
+        return {
+            "handle": handle,
+            "page": page,
+            "pages": pages,
+            "content": text[(page - 1) * page_chars:page * page_chars],
+        }
+
+
+# shared with the read_result tool
+store = ResultStore()
+
+
+def read_result(handle: str, page: int) -> dict:
+    """Read a page of a tool result that was too large and was shortened.
+
+    Note:
+        Shortened results include a `handle` and the number of `pages`.
+        Only read the pages you need.
+
+    Examples:
+        >>> read_result("r3", 2)
+        {"handle": "r3", "page": 2, "pages": 5, "content": "..."}
+
+    Args:
+        handle: The handle of the shortened result, e.g. 'r3'
+        page: The page to read, starting at 1
+
+    Returns:
+        dict: A page of the full result as JSON text, with the number of pages
+    """
+
+    return store.page(handle, page)
+
+
+class Compactor:
+    """Turn tool results into message content within a token budget per tool.
+
+    Results that fit are serialized as they are. Larger ones are shrunk by
+    `shrink`, and the full result is kept in a `ResultStore` under a handle the
+    model can pass to `read_result`.
+
+    Args:
+        budgets: A mapping of tool names to token budgets, merged over `DEFAULT_BUDGETS`.
+        default_budget: The token budget of tools not listed in `budgets`.
+        store: Where full results are kept, the store `read_result` reads by default.
+    """
+
+    def __init__(self, budgets: dict = None, default_budget: int = DEFAULT_BUDGET, store: ResultStore = store):
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.default_budget = default_budget
+        self.store = store
+
+    def compact(self, result: dict) -> str:
+        """Serialize a result from `handle_tool_calls` for the message history.
+
+        The tool name and any arguments are kept, since several calls of one tool
+        can be answered in the same turn.
+
+        Returns:
+            str: The JSON content of the tool message.
+        """
+
+        budget = self.budgets.get(result["name"], self.default_budget) * CHARS_PER_TOKEN
+        arguments = {"arguments": result["arguments"]} if result.get("arguments") else {}
+        if "error" in result:
+            return dumps({"name": result["name"], **arguments, "error": result["error"]})
+
+        value = result.get("result")
+        content = dumps({"name": result["name"], **arguments, "result": value})
+        if len(content) <= budget or result["name"] in EXEMPT:
+            return content
+
+        # the handle goes first, so it survives when the history condenses the message to its start
+        handle = self.store.put(value)
+        entry = {
+            "name": result["name"],
+            "handle": handle,
+            "pages": self.store.pages(handle),
+            "shortened": True,
+            "note": "Call read_result with the handle to read the full result a page at a time.",
+            **arguments,
+        }
+        entry["result"] = shrink(value, budget - len(dumps(entry)) - 20)
+        return dumps(entry)
@@ -0,0 +1,134 @@
+import ipaddress
+import math
+import threading
+import time
+from collections import Counter
+
+from toolset.sampler import as_of
+
+# seconds a snapshot is reused before psutil is walked again
+MIN_INTERVAL = 1.0
+
+PAGE_SIZE = 50
+
+GROUPS = {
+    "state": lambda row: row[4],
+    "remote": lambda row: row[2],
+    "local_port": lambda row: row[1],
+    "remote_port": lambda row: row[3],
+}
+
+
+def compact(row: tuple) -> str:
+    """Format a connection as `local_ip:port>remote_ip:port STATE`."""
+
+    local_ip, local_port, remote_ip, remote_port, status = row
+    return f"{local_ip}:{local_port}>{remote_ip}:{remote_port} {status}"
+
+
+def matches_remote(remote: str, address: str) -> bool:
+    if "/" in remote:
+        try:
+            return ipaddress.ip_address(address) in ipaddress.ip_network(remote, strict=False)
+        except ValueError:
+            return False
+    return address.startswith(remote)
+
+
+def paginate(items: list, page: int, page_size: int) -> dict:
+    pages = max(1, math.ceil(len(items) / page_size))
+    page = min(max(1, page), pages)
+    return {
+        "total": len(items),
+        "page": page,
+        "pages": pages,
+        "items": items[(page - 1) * page_size:page * page_size],
+    }
+
+
+class ConnectionSnapshots:
+    """Take snapshots of the active connections and answer filtered queries over them.
+
+    A snapshot is reused for `min_interval` seconds, so several queries in a row
+    walk `psutil.net_connections` only once. The rows returned by the previous
+    query's snapshot are kept, so a query can return only what changed since.
+
+    Args:
+        min_interval: Seconds a snapshot is reused before a new one is taken.
+    """
+
+    def __init__(self, min_interval: float = MIN_INTERVAL):
+        self.min_interval = min_interval
+        self.rows = frozenset()
+        self.taken_at = None
+        self.sampled_at = None
+        self.last_seen = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, refresh: bool = False, max_age: float = None) -> frozenset:
+        max_age = self.min_interval if max_age is None else max_age
+        with self._lock:
+            if refresh or self.taken_at is None or time.monotonic() - self.taken_at > max_age:
+                import psutil
+
+                self.rows = frozenset(
+                    (conn.laddr.ip, conn.laddr.port, conn.raddr.ip, conn.raddr.port, conn.status)
+                    for conn in psutil.net_connections(kind="inet")
+                    if conn.raddr  # Ignore listening ports
+                )
+                self.taken_at = time.monotonic()
+                self.sampled_at = time.time()
+            return self.rows
+
+    def query(self, port: int = None, state: str = None, remote: str = None, changes_only: bool = False,
+              group_by: str = None, page: int = 1, page_size: int = PAGE_SIZE, max_age: float = None) -> dict:
+        """Filter, diff, group, and paginate the current connections.
+
+        Args:
+            port: Only connections with this local or remote port.
+            state: Only connections in this state, e.g. 'ESTABLISHED'.
+            remote: Only connections to remote addresses starting with this prefix or inside this CIDR range.
+            changes_only: Only connections opened (`+`) or closed (`-`) since the previous query.
+            group_by: Count connections by `state`, `remote`, `local_port`, or `remote_port` instead of listing them.
+            page: The page of results to return.
+            page_size: The number of results per page.
+            max_age: Seconds an earlier snapshot may be reused for, `min_interval` by default.
+
+        Returns:
+            dict: The page of compact connections or group counts, with the total, number of pages, and
+                when the snapshot was taken.
+        """
+
+        if group_by is not None and group_by not in GROUPS:
+            return {"error": f"group_by must be one of {', '.join(GROUPS)}."}
+
+        rows = self.snapshot(max_age=max_age)
+        with self._lock:
+            previous, self.last_seen = self.last_seen, rows
+            sampled_at = self.sampled_at
+
+        def keep(row):
+            return (
+                (port is None or port in (row[1], row[3]))
+                and (state is None or row[4].lower() == state.lower())
+                and (remote is None or matches_remote(remote, row[2]))
+            )
+
+        if changes_only:
+            previous = previous if previous is not None else frozenset()
+            labelled = [("+", row) for row in sorted(rows - previous) if keep(row)]
+            labelled += [("-", row) for row in sorted(previous - rows) if keep(row)]
+        else:
+            labelled = [("", row) for row in sorted(rows) if keep(row)]
+
+        if group_by is not None:
+            counts = Counter(GROUPS[group_by](row) for _, row in labelled)
+            result = paginate([f"{key} {count}" for key, count in counts.most_common()], page, page_size)
+            result["groups"] = result.pop("items")
+            result["as_of"] = as_of(sampled_at)
+            return result
+
+        result = paginate([f"{sign} {compact(row)}" if sign else compact(row) for sign, row in labelled], page, page_size)
+        result["connections"] = result.pop("items")
+        result["as_of"] = as_of(sampled_at)
+        return result
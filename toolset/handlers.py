@@ -1,17 +1,86 @@
+import functools
+import time
+from concurrent.futures import TimeoutError
 
+from toolset import Toolset
+from toolset.cache import ToolCache
+from toolset.scheduler import Busy, Scheduler, Turn
+from toolset.tracing import span
 
-def handle_tool_calls(tool_calls, tools: list) -> list:
-    tools_dict = {f.__name__: f for f in tools}
-    res = []
-    for tool_call in tool_calls:
-        function = tools_dict[tool_call.function.name]
-        if tool_call.function.arguments:
-            result = function(**tool_call.function.arguments)
+# Shared by every session in this process, the per-tool limits also hold across processes through lock files.
+scheduler = Scheduler()
+
+
+def run_tool_call(function, tool_call, cache: ToolCache = None):
+    with span(f"tool:{tool_call.function.name}", arguments=tool_call.function.arguments):
+        if cache is not None:
+            return cache.call(tool_call.function.name, function, tool_call.function.arguments)
+        elif tool_call.function.arguments:
+            return function(**tool_call.function.arguments)
         else:
-            result = function()
-        res.append({
-            "name": tool_call.function.name,
-            "arguments": tool_call.function.arguments,
-            "result": result,
-        })
-    return res
+            return function()
+
+
+def handle_tool_calls(tool_calls, tools, cache: ToolCache = None, timeout: float = 30, turn: Turn = None) -> list:
+    """Run the tool calls of a model response concurrently.
+
+    Results are returned in the same order as `tool_calls`. A call that raises,
+    times out, is cancelled, or names an unknown tool gets an `error` entry in
+    place of a `result`, and the other calls are unaffected.
+
+    Args:
+        tool_calls: The tool calls from `response.message.tool_calls`.
+        tools: The `Toolset` or list of callables available to the model.
+        cache: An optional cache of tool results.
+        timeout: Seconds each call may run, counted from when the batch starts.
+        turn: The turn the calls belong to, whose deadline and cancellation apply to every call.
+            Without one, the batch is its own turn.
+
+    Returns:
+        list: A dictionary per tool call with its name, arguments, and result or error.
+    """
+
+    turn = turn or Turn(timeout)
+    with span("handle_tool_calls", calls=len(tool_calls)):
+        tools_dict = tools.dispatch if isinstance(tools, Toolset) else {f.__name__: f for f in tools}
+        futures = []
+        for tool_call in tool_calls:
+            function = tools_dict.get(tool_call.function.name)
+            if function is None:
+                futures.append(f"Unknown tool '{tool_call.function.name}'.")
+                continue
+            try:
+                futures.append(scheduler.submit(
+                    tool_call.function.name,
+                    functools.partial(run_tool_call, function, tool_call, cache),
+                    turn,
+                ))
+            except Busy as e:
+                futures.append(str(e))
+
+        deadline = min(time.monotonic() + timeout, turn.deadline)
+        res = []
+        for tool_call, future in zip(tool_calls, futures):
+            entry = {
+                "name": tool_call.function.name,
+                "arguments": tool_call.function.arguments,
+            }
+            if isinstance(future, str):
+                entry["error"] = future
+            else:
+                try:
+                    entry["result"] = future.result(timeout=max(0, deadline - time.monotonic()))
+                except TimeoutError:
+                    future.cancel()
+                    if turn.expired():
+                        entry["error"] = "The turn ran out of time."
+                    else:
+                        entry["error"] = f"Timed out after {timeout} seconds."
+                except Exception as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+            res.append(entry)
+
+        # stop calls still running on the turn's time, e.g. kill their subprocesses
+        if turn.expired():
+            turn.cancel()
+        return res
@@ -0,0 +1,147 @@
+import json
+
+# ollama's default context window when `num_ctx` is not set
+DEFAULT_NUM_CTX = 2048
+
+# characters of a tool result kept when it is condensed
+CONDENSED_LENGTH = 200
+
+
+def estimate_tokens(message) -> int:
+    """Roughly estimate the tokens a message adds to the prompt.
+
+    Uses about four characters per token plus a few tokens for the chat template,
+    which is close enough to budget against without loading a tokenizer.
+
+    Args:
+        message: A chat message with `role` and `content`.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    tokens = len(content) // 4 + 4
+    for tool_call in message.get("tool_calls") or []:
+        tokens += len(json.dumps(tool_call, default=str)) // 4
+    return tokens
+
+
+def condense(content: str, length: int = CONDENSED_LENGTH) -> str:
+    if len(content) <= length or content.endswith(" characters removed]"):
+        return content
+    return f"{content[:length]}... [condensed, {len(content) - length} characters removed]"
+
+
+class History:
+    """Keep a list of chat messages within a token budget.
+
+    The list is trimmed in place, so the caller can keep appending to it as usual.
+    Leading system messages are pinned, and the current turn (everything from the
+    last user message on) is never touched. When over budget, older tool results are
+    condensed first, then older turns are summarized or dropped, oldest first. Turns
+    beyond `max_turns` are dropped even within budget, e.g. when a long-term memory
+    brings back what is relevant instead.
+
+    Args:
+        messages: The list of chat messages to manage.
+        num_ctx: The context window of the model, in tokens.
+        reserve: Tokens kept free for the model's reply.
+        summarize: An optional callable that takes a list of messages and returns a summary string.
+            Without it, older turns are dropped.
+        max_turns: The most turns kept, or None to keep as many as fit.
+        archive: An optional callable that is given the messages of dropped turns before they are discarded.
+    """
+
+    def __init__(self, messages: list, num_ctx: int = DEFAULT_NUM_CTX, reserve: int = 512, summarize=None,
+                 max_turns: int = None, archive=None):
+        self.messages = messages
+        self.num_ctx = num_ctx
+        self.reserve = reserve
+        self.summarize = summarize
+        self.max_turns = max_turns
+        self.archive = archive
+        self.summary = None
+
+    @property
+    def budget(self) -> int:
+        return self.num_ctx - self.reserve
+
+    def tokens(self) -> int:
+        return sum(estimate_tokens(message) for message in self.messages)
+
+    def pinned(self) -> int:
+        """The number of leading system messages, not counting the summary of earlier turns."""
+
+        count = 0
+        for message in self.messages:
+            if message.get("role") != "system" or message is self.summary:
+                break
+            count += 1
+        return count
+
+    def current_turn(self) -> int:
+        """The index of the last user message."""
+
+        for i in range(len(self.messages) - 1, -1, -1):
+            if self.messages[i].get("role") == "user":
+                return i
+        return len(self.messages)
+
+    def turns(self) -> int:
+        """The number of turns after the pinned messages, counting the current one."""
+
+        return sum(1 for message in self.messages[self.pinned():] if message.get("role") == "user")
+
+    def drop_turn(self, start: int) -> list:
+        """Remove the turn starting at `start`, returning its messages."""
+
+        stop = start + 1
+        while stop < self.current_turn() and self.messages[stop].get("role") != "user":
+            stop += 1
+        dropped = self.messages[start:stop]
+        del self.messages[start:stop]
+        return dropped
+
+    def fit(self) -> list:
+        """Trim the messages until they fit in the budget.
+
+        Returns:
+            list: The managed list of messages, ready to send.
+        """
+
+        start = self.pinned()
+        dropped = []
+        if self.max_turns is not None:
+            while self.turns() > self.max_turns and start < self.current_turn():
+                dropped.extend(self.drop_turn(start))
+
+        if self.tokens() <= self.budget:
+            return self.finish(start, dropped)
+
+        end = self.current_turn()
+        for i in range(start, end):
+            message = self.messages[i]
+            if message.get("role") == "tool" and message.get("content"):
+                self.messages[i] = {**message, "content": condense(message["content"])}
+        if self.tokens() <= self.budget:
+            return self.finish(start, dropped)
+
+        # drop whole turns so tool results are never separated from the call that made them,
+        # the previous summary sits first and is folded into the next one
+        while self.tokens() > self.budget and start < self.current_turn():
+            dropped.extend(self.drop_turn(start))
+        return self.finish(start, dropped)
+
+    def finish(self, start: int, dropped: list) -> list:
+        if dropped and self.archive is not None:
+            self.archive([message for message in dropped if message is not self.summary])
+        if dropped and self.summarize is not None:
+            self.summary = {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {self.summarize(dropped)}",
+            }
+            self.messages.insert(start, self.summary)
+        return self.messages
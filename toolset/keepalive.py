@@ -0,0 +1,189 @@
+import json
+import os
+import re
+import threading
+import time
+
+from toolset.telemetry import timings
+from toolset.web import CACHE_ROOT
+
+# where sessions on this machine record which model they are using
+LEASE_DIR = CACHE_ROOT / "leases"
+
+# how long the model stays loaded after each request or heartbeat
+KEEP_ALIVE = 600
+
+# seconds between heartbeats while a session is active, well inside KEEP_ALIVE
+HEARTBEAT = 240
+
+# seconds without a prompt after which a session is idle and stops keeping its model loaded
+IDLE_AFTER = 1800
+
+# models the machine can keep loaded at once, e.g. 1 when both do not fit in VRAM
+MAX_LOADED = 1
+
+
+class KeepAlive:
+    """Preload a model and keep it loaded while its session is active.
+
+    The model is loaded on `start`, in the background so the first prompt can be
+    typed meanwhile, and kept loaded with a heartbeat until the session has had no
+    prompt for `idle_after` seconds. Each load is reported as cold or warm.
+
+    Sessions on one machine coordinate through lease files. When more models are
+    active than `max_loaded`, only the most recently used keep their heartbeat, so
+    two sessions with different models stop evicting each other, and an idle
+    session unloads its model to make room, unless another session still uses it.
+
+    Args:
+        model: The model to keep loaded.
+        client: The client to call, e.g. an `ollama.Client` or `ClientPool` session, or the default client.
+        keep_alive: Seconds the model stays loaded after each request.
+        heartbeat: Seconds between heartbeats.
+        idle_after: Seconds without a prompt after which the session is idle.
+        max_loaded: The models that may be kept loaded at once.
+        lease_dir: The directory of lease files shared by the sessions on this machine.
+        options: The load options of the session's requests, e.g. `num_ctx`, which heartbeats must match
+            or the server reloads the model.
+    """
+
+    def __init__(self, model: str, client=None, keep_alive: float = KEEP_ALIVE, heartbeat: float = HEARTBEAT,
+                 idle_after: float = IDLE_AFTER, max_loaded: int = MAX_LOADED, lease_dir=LEASE_DIR,
+                 options=None):
+        import ollama
+
+        self.model = model
+        self.client = client or ollama
+        self.keep_alive = keep_alive
+        self.heartbeat = heartbeat
+        self.idle_after = idle_after
+        self.max_loaded = max_loaded
+        self.lease_dir = lease_dir
+        self.options = options
+        self.lease = lease_dir / f"{re.sub(r'[^A-Za-z0-9._-]', '_', model)}-{os.getpid()}.json"
+        self.active = time.time()
+        self.loads = {"cold": 0, "warm": 0}
+        self.last_load = None
+        self.heartbeats = 0
+        self.yielded = 0
+        self.holding = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self) -> dict:
+        """Load the model, or refresh how long it stays loaded, with an empty request.
+
+        Returns:
+            dict: The timings of the request, with whether the load was `cold`.
+        """
+
+        response = self.client.generate(model=self.model, prompt="", options=self.options, keep_alive=self.keep_alive)
+        record = timings(response)
+        self.loads["cold" if record["cold"] else "warm"] += 1
+        self.last_load = record
+        return record
+
+    def unload(self):
+        self.client.generate(model=self.model, prompt="", keep_alive=0)
+
+    def touch(self):
+        """Mark the session active, e.g. on each prompt, waking the heartbeat if it had stopped."""
+
+        wake = self.idle() or not self.holding
+        self.active = time.time()
+        self.write_lease()
+        if wake:
+            self._wake.set()
+
+    def idle(self) -> bool:
+        return time.time() - self.active > self.idle_after
+
+    def write_lease(self):
+        self.lease_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.lease.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"model": self.model, "pid": os.getpid(), "active": self.active}))
+        tmp.replace(self.lease)
+
+    def leases(self) -> list:
+        """The leases of active sessions on this machine, including this one while it is active."""
+
+        now = time.time()
+        leases = []
+        for path in self.lease_dir.glob("*.json"):
+            try:
+                lease = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if now - lease["active"] <= self.idle_after:
+                leases.append(lease)
+        return leases
+
+    def allowed(self) -> bool:
+        """Whether this model is among the `max_loaded` most recently used models."""
+
+        latest = {}
+        for lease in self.leases():
+            latest[lease["model"]] = max(latest.get(lease["model"], 0), lease["active"])
+        latest[self.model] = max(latest.get(self.model, 0), self.active)
+        ranked = sorted(latest, key=latest.get, reverse=True)
+        return self.model in ranked[:self.max_loaded]
+
+    def beat(self):
+        """Keep the model loaded if the session is active and the model has room, or release it."""
+
+        if not self.idle() and self.allowed():
+            self.load()
+            self.heartbeats += 1
+            self.holding = True
+            return
+        self.yielded += 1
+        self.holding = False
+        if self.idle():
+            self.release()
+
+    def release(self):
+        self.lease.unlink(missing_ok=True)
+        # another session may still be using the model
+        if not any(lease["model"] == self.model for lease in self.leases()):
+            self.unload()
+
+    def run(self):
+        self.touch()
+        while not self._stopped.is_set():
+            self._wake.clear()
+            try:
+                self.beat()
+            except Exception as e:
+                # the server may be restarting, try again on the next heartbeat
+                print(f"Could not keep {self.model} loaded: {e}")
+            if self.idle():
+                # nothing to keep loaded until the next prompt
+                self._wake.wait()
+            else:
+                self._wake.wait(self.heartbeat)
+
+    def start(self):
+        """Preload the model and keep it loaded on a background thread."""
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self.run, name=f"keepalive-{self.model}", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the heartbeat and drop the lease, leaving the model to unload when its keep alive runs out."""
+
+        self._stopped.set()
+        self._wake.set()
+        self.lease.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "loads": dict(self.loads),
+            "last_load_seconds": self.last_load["load_duration"] if self.last_load else None,
+            "heartbeats": self.heartbeats,
+            "yielded": self.yielded,
+            "idle": self.idle(),
+        }
@@ -0,0 +1,184 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from toolset.history import estimate_tokens
+from toolset.semantic_cache import DEFAULT_MODEL
+from toolset.web import CACHE_ROOT
+
+DEFAULT_PATH = CACHE_ROOT / "memory"
+
+# characters of a message embedded as one chunk, and the characters consecutive chunks share
+CHUNK_CHARS = 800
+OVERLAP = 100
+
+# chunks recalled into the prompt each turn
+TOP_K = 4
+
+# cosine similarity a chunk needs to be recalled at all
+MIN_SCORE = 0.5
+
+# tokens the recalled chunks may take in the prompt
+BUDGET = 512
+
+# chunks kept before the least recently recalled are evicted
+CAPACITY = 16384
+
+
+def chunks(text: str, size: int = CHUNK_CHARS, overlap: int = OVERLAP) -> list:
+    """Split text into chunks of at most `size` characters, breaking at whitespace where possible."""
+
+    text = text.strip()
+    parts = []
+    while len(text) > size:
+        cut = text.rfind(" ", size // 2, size)
+        cut = cut if cut > 0 else size
+        parts.append(text[:cut].strip())
+        text = text[max(1, cut - overlap):]
+    if text:
+        parts.append(text.strip())
+    return parts
+
+
+def label(message: dict) -> str:
+    if message.get("role") == "tool" and message.get("tool_name"):
+        return f"tool {message['tool_name']}"
+    return message.get("role", "")
+
+
+class Memory:
+    """A long-term memory of past turns, recalled by relevance instead of replayed in full.
+
+    Messages dropped from the history are split into chunks, embedded with the
+    Ollama embed API, and kept in a memory-mapped vector store on disk, so memory
+    carries over between sessions. Each turn, the chunks most similar to the
+    user's prompt are recalled into a system message. Dropped turns are archived
+    on a background thread, so embedding them never delays a reply.
+
+    Args:
+        model: The embedding model.
+        host: The Ollama host to embed with, or the default host.
+        client: A client to embed with instead, e.g. a `ClientPool` session.
+        path: The directory to keep the vector store in.
+        capacity: The chunks kept before the least recently recalled are evicted.
+        k: The chunks recalled each turn.
+        min_score: The cosine similarity a chunk needs to be recalled.
+        budget: The tokens the recalled chunks may take in the prompt.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, host: str = None, client=None, path=DEFAULT_PATH,
+                 capacity: int = CAPACITY, k: int = TOP_K, min_score: float = MIN_SCORE, budget: int = BUDGET):
+        import ollama
+
+        # numpy is slow to import, so only pay for it when a memory is made
+        from toolset.vectors import VectorStore
+
+        self.model = model
+        self.client = client or ollama.Client(host=host)
+        self.store = VectorStore(path, capacity)
+        self.k = k
+        self.min_score = min_score
+        self.budget = budget
+        self._recalled = None
+        self._lock = threading.Lock()
+        # one thread, so turns are stored in the order they were dropped
+        self._archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+
+    def remember(self, messages: list) -> int:
+        """Embed and store messages, e.g. the turns the history dropped.
+
+        Returns:
+            int: The number of chunks stored.
+        """
+
+        now = time.time()
+        items = []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, str) or not content.strip() or message.get("role") == "system":
+                continue
+            for text in chunks(content):
+                items.append({"role": label(message), "text": text, "created": now})
+        if not items:
+            return 0
+        # one request embeds every chunk
+        vectors = self.client.embed(model=self.model, input=[f"{item['role']}: {item['text']}" for item in items])
+        self.store.add_many(vectors.embeddings, items)
+        return len(items)
+
+    def archive(self, messages: list):
+        """Remember messages on the background thread, e.g. as the `archive` of a `History`."""
+
+        self._archiver.submit(self.remember_quietly, list(messages))
+
+    def remember_quietly(self, messages: list):
+        try:
+            self.remember(messages)
+        except Exception as e:
+            # the server may be down, the turns are lost but the session goes on
+            print(f"Could not remember {len(messages)} messages: {e}")
+
+    def close(self):
+        """Wait for the turns being archived to be stored."""
+
+        self._archiver.shutdown(wait=True)
+
+    def recall(self, query: str) -> list:
+        """Find the stored chunks most relevant to a query.
+
+        The result is kept for the same query, so the tool rounds of a turn embed the prompt once.
+
+        Returns:
+            list: The recalled items, most relevant first, each with `role`, `text`, and `created`.
+        """
+
+        with self._lock:
+            if self._recalled is not None and self._recalled[0] == query:
+                return self._recalled[1]
+        items = []
+        if len(self.store):
+            vector = self.client.embed(model=self.model, input=query).embeddings[0]
+            for score, slot, item in self.store.search(vector, self.k):
+                if score < self.min_score:
+                    break
+                self.store.touch(slot)
+                items.append(item)
+        with self._lock:
+            self._recalled = (query, items)
+        return items
+
+    def context(self, query: str):
+        """A system message with the chunks recalled for a query, within the token budget.
+
+        Returns:
+            dict: The message, or None if nothing relevant was recalled.
+        """
+
+        lines = []
+        tokens = estimate_tokens({"content": "Relevant notes from earlier conversations:"})
+        for item in self.recall(query):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(item["created"]))
+            line = f"- [{when}] {item['role']}: {item['text']}"
+            tokens += len(line) // 4 + 1
+            if tokens > self.budget:
+                break
+            lines.append(line)
+        if not lines:
+            return None
+        return {"role": "system", "content": "\n".join(["Relevant notes from earlier conversations:", *lines])}
+
+    def with_context(self, messages: list) -> list:
+        """A copy of `messages` with recalled notes for the last user message after the leading system messages.
+
+        Returns:
+            list: The messages to send.
+        """
+
+        query = next((message["content"] for message in reversed(messages) if message.get("role") == "user"), None)
+        note = self.context(query) if query else None
+        if note is None:
+            return messages
+        pinned = 0
+        while pinned < len(messages) and messages[pinned].get("role") == "system":
+            pinned += 1
+        return [*messages[:pinned], note, *messages[pinned:]]
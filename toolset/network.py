@@ -1,28 +1,43 @@
+import ipaddress
+import math
 import platform
+import re
 import socket
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-import psutil
-import requests
-import scapy.all as scapy
+from toolset.connections import ConnectionSnapshots
+from toolset.sampler import HostSampler, as_of
+from toolset.scanner import ArpScanner
+from toolset.web import TIMEOUT, get_session
 
+# psutil and scapy are imported where they are used, scapy alone
+# takes seconds to import and most sessions never scan the network
 
-def get_local_ip() -> str:
-    """Get the local IP address of the machine.
+# hosts ping_sweep pings at once
+SWEEP_WORKERS = 64
 
-    Returns:
-        str: The local IP address, e.g., '192.168.1.100'.
-    """
+# seconds ping_sweep waits for each host to reply
+SWEEP_TIMEOUT = 1
+
+# most hosts ping_sweep checks in one call, a /22
+SWEEP_MAX_HOSTS = 1024
+
+# shared so changes can be reported since the previous call
+connections = ConnectionSnapshots()
 
+# shared so a rescan only probes hosts whose cached results have expired
+scanner = ArpScanner()
+
+
+def local_ip() -> str:
     return socket.gethostbyname(socket.gethostname())
 
 
-def get_network_interfaces() -> dict:
-    """Returns a dictionary of network interfaces and their IP addresses.
+def network_interfaces() -> dict:
+    import psutil
 
-    Returns:
-        dict: A mapping of interface names to their IP addresses.
-    """
     interfaces = {}
     for interface, addrs in psutil.net_if_addrs().items():
         for addr in addrs:
@@ -31,6 +46,59 @@ def get_network_interfaces() -> dict:
     return interfaces
 
 
+def public_ip() -> str:
+    return get_session().get("https://api64.ipify.org?format=text", timeout=TIMEOUT).text
+
+
+# keeps host state in memory, refreshed in the background from the first tool call on
+# so later tool calls do not wait for it
+sampler = HostSampler()
+sampler.add("local_ip", local_ip)
+sampler.add("network_interfaces", network_interfaces)
+sampler.add("public_ip", public_ip)
+sampler.add("connections", lambda: connections.snapshot(refresh=True))
+
+
+def sampled(name: str, key: str, refresh: bool) -> dict:
+    sampler.start()
+    entry = sampler.get(name, bool(refresh))
+    if "error" in entry:
+        return {"error": entry["error"], "as_of": as_of(entry["sampled_at"])}
+    return {key: entry["value"], "as_of": as_of(entry["sampled_at"])}
+
+
+def get_local_ip(refresh: Optional[bool] = False) -> dict:
+    """Get the local IP address of the machine.
+
+    Note:
+        The address is sampled every few minutes. Only refresh if it may have just changed.
+
+    Args:
+        refresh: Look the address up again instead of using the latest sample
+
+    Returns:
+        dict: The local IP address, e.g., '192.168.1.100', and when it was sampled.
+    """
+
+    return sampled("local_ip", "ip", refresh)
+
+
+def get_network_interfaces(refresh: Optional[bool] = False) -> dict:
+    """Returns a dictionary of network interfaces and their IP addresses.
+
+    Note:
+        The interfaces are sampled every minute. Only refresh if they may have just changed.
+
+    Args:
+        refresh: List the interfaces again instead of using the latest sample
+
+    Returns:
+        dict: A mapping of interface names to their IP addresses, and when it was sampled.
+    """
+
+    return sampled("network_interfaces", "interfaces", refresh)
+
+
 def ping_device(host: str) -> bool:
     """Ping a device to check if it's reachable.
 
@@ -45,23 +113,150 @@ def ping_device(host: str) -> bool:
     return result.returncode == 0
 
 
-def get_active_connections() -> list:
-    """Get a list of active network connections.
+def ping_args(host: str, timeout: float) -> list:
+    system = platform.system().lower()
+    if system == "windows":
+        return ["ping", "-n", "1", "-w", str(int(timeout * 1000)), host]
+    if system == "darwin":
+        return ["ping", "-c", "1", "-t", str(math.ceil(timeout)), host]
+    return ["ping", "-c", "1", "-W", str(math.ceil(timeout)), host]
+
+
+def ping_rtt(host: str, timeout: float = SWEEP_TIMEOUT):
+    """Ping a host once.
+
+    Returns:
+        float: The round-trip time in milliseconds, or None if the host did not reply in time.
+
+    Raises:
+        FileNotFoundError: If there is no ping command, which says nothing about the host.
+    """
+
+    try:
+        result = subprocess.run(ping_args(host, timeout), capture_output=True, text=True, timeout=timeout + 1)
+    except FileNotFoundError:
+        raise
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    match = re.search(r"time[=<]\s*([\d.]+)\s*ms", result.stdout)
+    return float(match.group(1)) if match else 0.0
+
+
+def expand_hosts(hosts_or_cidr: str) -> list:
+    """Expand a comma or space separated list of hosts and CIDR ranges into hosts."""
+
+    hosts = []
+    for token in re.split(r"[,\s]+", hosts_or_cidr.strip()):
+        if not token:
+            continue
+        if "/" in token:
+            network = ipaddress.ip_network(token, strict=False)
+            if network.num_addresses > SWEEP_MAX_HOSTS + 2:
+                raise ValueError(f"{token} has more than {SWEEP_MAX_HOSTS} hosts.")
+            hosts.extend(str(address) for address in network.hosts())
+        else:
+            hosts.append(token)
+    return list(dict.fromkeys(hosts))
+
+
+def collapse(hosts: list) -> list:
+    """Collapse consecutive IPv4 addresses into `first-last` ranges, keeping other hosts as they are."""
+
+    addresses, others = [], []
+    for host in hosts:
+        try:
+            addresses.append(ipaddress.IPv4Address(host))
+        except ValueError:
+            others.append(host)
+
+    ranges = []
+    for address in sorted(addresses):
+        if ranges and int(address) == int(ranges[-1][1]) + 1:
+            ranges[-1][1] = address
+        else:
+            ranges.append([address, address])
+    return [str(first) if first == last else f"{first}-{last}" for first, last in ranges] + others
+
+
+def ping_sweep(hosts_or_cidr: str) -> dict:
+    """Ping many hosts at once to check which are reachable.
+
+    Note:
+        Use this instead of several calls to `ping_device` when checking more than one host.
+        At most 1024 hosts are checked per call.
+
+    Examples:
+        >>> ping_sweep("192.168.1.0/24")
+        {"reachable": {"192.168.1.1": 0.8, "192.168.1.20": 3.1}, "unreachable": ["192.168.1.2-192.168.1.19", "192.168.1.21-192.168.1.254"]}
+
+    Args:
+        hosts_or_cidr: Hosts, IP addresses, or CIDR ranges separated by commas or spaces, e.g. '10.0.0.1, example.com, 192.168.1.0/24'
+
+    Returns:
+        dict: The round-trip times in milliseconds of the reachable hosts, and the unreachable hosts as ranges
+    """
+
+    try:
+        hosts = expand_hosts(hosts_or_cidr)
+    except ValueError as e:
+        return {"error": str(e)}
+    if len(hosts) > SWEEP_MAX_HOSTS:
+        return {"error": f"{len(hosts)} hosts given, at most {SWEEP_MAX_HOSTS} can be checked at once."}
+    if not hosts:
+        return {"error": "No hosts given."}
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(SWEEP_WORKERS, len(hosts))) as pool:
+            rtts = list(pool.map(ping_rtt, hosts))
+    except FileNotFoundError as e:
+        return {"error": f"Could not run ping: {e}"}
+
+    return {
+        "reachable": {host: rtt for host, rtt in zip(hosts, rtts) if rtt is not None},
+        "unreachable": collapse([host for host, rtt in zip(hosts, rtts) if rtt is None]),
+    }
+
+
+def get_active_connections(port: Optional[int] = None, state: Optional[str] = None, remote: Optional[str] = None,
+                           changes_only: Optional[bool] = False, group_by: Optional[str] = None,
+                           page: Optional[int] = 1, refresh: Optional[bool] = False) -> dict:
+    """Get the active network connections, filtered and a page at a time.
+
+    Note:
+        Busy machines have thousands of connections. Filter by port, state, or remote address,
+        or use group_by to get counts, instead of reading every page.
+
+    Examples:
+        >>> get_active_connections(state="ESTABLISHED", port=443)
+        {"total": 2, "page": 1, "pages": 1, "connections": ["192.168.1.5:51234>140.82.112.3:443 ESTABLISHED", ...]}
+
+    Args:
+        port: Only connections with this local or remote port
+        state: Only connections in this state, e.g. 'ESTABLISHED' or 'TIME_WAIT'
+        remote: Only connections to remote addresses starting with this prefix or in this CIDR range, e.g. '10.0.0.0/8'
+        changes_only: Only connections opened (+) or closed (-) since the previous call
+        group_by: Count connections by 'state', 'remote', 'local_port', or 'remote_port' instead of listing them
+        page: The page of results to return, starting at 1
+        refresh: Take a new snapshot instead of using the latest one, which is a few seconds old at most
 
     Returns:
-        A list of tuples (local_address, remote_address, status).
+        dict: Connections as 'local_ip:port>remote_ip:port STATE' strings, or group counts, with the total, number of pages,
+            and when the snapshot was taken
     """
 
-    connections = []
-    for conn in psutil.net_connections(kind="inet"):
-        if conn.raddr:  # Ignore listening ports
-            connections.append((conn.laddr.ip, conn.laddr.port, conn.raddr.ip, conn.raddr.port, conn.status))
-    return connections
+    sampler.start()
+    max_age = 0 if refresh else sampler.interval("connections")
+    return connections.query(port, state, remote, bool(changes_only), group_by, page or 1, max_age=max_age)
 
 
 def scan_network(ip_range: str) -> list:
     """Get connected devices by scanning the local network.
 
+    Note:
+        Results are cached for a few minutes, so scanning the same range again is fast.
+
     Args:
         ip_range: The subnet range to scan (e.g., '192.168.1.0/24').
 
@@ -69,21 +264,20 @@ def scan_network(ip_range: str) -> list:
         list: A list of dictionaries with IP and MAC addresses.
     """
 
-    arp_request = scapy.ARP(pdst=ip_range)
-    broadcast = scapy.Ether(dst="ff:ff:ff:ff:ff:ff")
-    response = scapy.srp(broadcast / arp_request, timeout=2, verbose=False)[0]
+    return scanner.scan(ip_range)
 
-    devices = []
-    for sent, received in response:
-        devices.append({"ip": received.psrc, "mac": received.hwsrc})
 
-    return devices
+def get_public_ip(refresh: Optional[bool] = False) -> dict:
+    """Returns the public IP address of the machine.
 
+    Note:
+        The address is sampled every ten minutes. Only refresh if it may have just changed.
 
-def get_public_ip() -> str:
-    """Returns the public IP address of the machine.
+    Args:
+        refresh: Look the address up again instead of using the latest sample
 
     Returns:
-        str: The external IP address, e.g., '203.0.113.45'.
+        dict: The external IP address, e.g., '203.0.113.45', and when it was sampled.
     """
-    return requests.get("https://api64.ipify.org?format=text").text
+
+    return sampled("public_ip", "ip", refresh)
@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import OrderedDict
+
+# seconds between health probes of every host
+PROBE_INTERVAL = 10
+
+# seconds a health probe may take
+PROBE_TIMEOUT = 2
+
+# seconds a request may take before the host is treated as down
+TIMEOUT = 300
+
+# sessions whose host is remembered, the least recently used are forgotten first
+MAX_SESSIONS = 4096
+
+
+class Host:
+    def __init__(self, url: str, timeout: float):
+        import ollama
+
+        self.url = url
+        self.client = ollama.Client(host=url, timeout=timeout)
+        self.probe_client = ollama.Client(host=url, timeout=PROBE_TIMEOUT)
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.checked = None
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+def retriable(error: Exception) -> bool:
+    """Whether a failed request should be retried on another host: the host is unreachable or failing."""
+
+    import httpx
+    import ollama
+
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+
+class ClientPool:
+    """Spread chat, generate, and embed requests across several Ollama hosts.
+
+    Each request goes to the healthy host with the fewest requests in flight. A
+    session sticks to the host it first used, so the host can reuse the KV cache of
+    its conversation, and only moves when that host fails. A request that cannot
+    reach its host, or gets a server error, is retried on the next host and the
+    failed host is left out until a health probe finds it up again.
+
+    Args:
+        hosts: The Ollama hosts, e.g. `["http://127.0.0.1:11434", "http://10.0.0.2:11434"]`.
+        probe_interval: Seconds between health probes, or None to only probe on `probe()`.
+        timeout: Seconds a request may take.
+    """
+
+    def __init__(self, hosts: list, probe_interval: float = PROBE_INTERVAL, timeout: float = TIMEOUT):
+        if not hosts:
+            raise ValueError("At least one host is needed.")
+        self.hosts = [Host(url, timeout) for url in hosts]
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        if probe_interval:
+            threading.Thread(target=self._probe_forever, args=(probe_interval,), daemon=True).start()
+
+    def probe(self):
+        """Check every host, marking each healthy or not."""
+
+        import httpx
+        import ollama
+
+        for host in self.hosts:
+            try:
+                host.probe_client.ps()
+                healthy = True
+            except (ConnectionError, ollama.ResponseError, httpx.HTTPError):
+                healthy = False
+            with self._lock:
+                host.healthy = healthy
+                host.checked = time.time()
+
+    def _probe_forever(self, interval: float):
+        while not self._stopped.wait(interval):
+            self.probe()
+
+    def close(self):
+        self._stopped.set()
+
+    def candidates(self, session=None) -> list:
+        """The hosts to try in order: the session's host, then the healthy hosts by load, then the rest."""
+
+        with self._lock:
+            ranked = sorted(self.hosts, key=lambda host: (not host.healthy, host.outstanding, host.requests))
+            bound = self.sessions.get(session) if session is not None else None
+            if bound is not None and bound.healthy:
+                self.sessions.move_to_end(session)
+                ranked.remove(bound)
+                ranked.insert(0, bound)
+            return ranked
+
+    def start(self, host: Host, session=None):
+        with self._lock:
+            host.outstanding += 1
+            host.requests += 1
+            if session is not None:
+                self.sessions[session] = host
+                self.sessions.move_to_end(session)
+                while len(self.sessions) > MAX_SESSIONS:
+                    self.sessions.popitem(last=False)
+
+    def finish(self, host: Host, error: Exception = None):
+        with self._lock:
+            host.outstanding -= 1
+            if error is not None:
+                host.failures += 1
+                host.healthy = False
+
+    def call(self, method: str, session=None, **request):
+        """Make a request on the best host, failing over to the others.
+
+        Args:
+            method: The client method, `chat`, `generate`, or `embed`.
+            session: Any hashable id of the conversation, to keep it on one host.
+            **request: The arguments of the client method.
+
+        Returns:
+            The response, or an iterator of chunks when streaming.
+        """
+
+        error = None
+        for host in self.candidates(session):
+            self.start(host, session)
+            try:
+                response = getattr(host.client, method)(**request)
+                if request.get("stream"):
+                    # the request is only sent when the stream is first read
+                    first = next(response, None)
+                    return self.stream(host, first, response)
+            except Exception as e:
+                if not retriable(e):
+                    self.finish(host)
+                    raise
+                self.finish(host, e)
+                error = e
+                continue
+            self.finish(host)
+            return response
+        raise error
+
+    def stream(self, host: Host, first, chunks):
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        finally:
+            self.finish(host)
+
+    def chat(self, session=None, **request):
+        return self.call("chat", session, **request)
+
+    def generate(self, session=None, **request):
+        return self.call("generate", session, **request)
+
+    def embed(self, session=None, **request):
+        return self.call("embed", session, **request)
+
+    def session(self, session):
+        """A client-like view of the pool whose requests all belong to one session."""
+
+        return Session(self, session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {host.url: host.stats() for host in self.hosts}
+
+
+class Session:
+    """The pool's `chat`, `generate`, and `embed` bound to a session, usable wherever an `ollama.Client` is."""
+
+    def __init__(self, pool: ClientPool, session):
+        self.pool = pool
+        self.id = session
+
+    def chat(self, **request):
+        return self.pool.chat(self.id, **request)
+
+    def generate(self, **request):
+        return self.pool.generate(self.id, **request)
+
+    def embed(self, **request):
+        return self.pool.embed(self.id, **request)
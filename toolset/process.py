@@ -0,0 +1,179 @@
+import codecs
+import contextvars
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from toolset.scheduler import current_turn
+
+# characters of output kept per stream, half from the start and half from the end
+MAX_CHARS = 16_000
+
+# lines of output kept per stream, half from the start and half from the end
+MAX_LINES = 200
+
+TIMEOUT = 5
+
+# commands that run at once in this process, the scheduler's subprocess_run_command limit holds across processes
+WORKERS = 4
+
+# bytes read from a pipe at a time
+CHUNK_SIZE = 65536
+
+
+class TimedOut(Exception):
+    pass
+
+
+class Capture:
+    """Keep the start and end of a stream of text within a character and line limit.
+
+    Text past the head limit flows into a tail that is trimmed as it grows, so
+    memory stays bounded however much a command prints.
+
+    Args:
+        max_chars: The characters kept, split between the head and the tail.
+        max_lines: The lines kept, split between the head and the tail.
+    """
+
+    def __init__(self, max_chars: int = MAX_CHARS, max_lines: int = MAX_LINES):
+        self.head_chars = max_chars // 2
+        self.head_lines = max_lines // 2
+        self.tail_chars = max_chars - self.head_chars
+        self.tail_lines = max_lines - self.head_lines
+        self.head = []
+        self.head_size = 0
+        self.head_count = 0
+        self.tail = ""
+        self.full = False
+        self.total_chars = 0
+        self.total_lines = 0
+
+    def write(self, text: str):
+        self.total_chars += len(text)
+        self.total_lines += text.count("\n")
+        if not self.full:
+            cut = self.head_chars - self.head_size
+            newline = -1
+            for _ in range(self.head_lines - self.head_count):
+                newline = text.find("\n", newline + 1)
+                if newline < 0:
+                    break
+            else:
+                cut = min(cut, newline + 1)
+            part = text[:cut]
+            self.head.append(part)
+            self.head_size += len(part)
+            self.head_count += part.count("\n")
+            text = text[cut:]
+            if not text:
+                return
+            self.full = True
+        self.tail += text
+        if len(self.tail) > 2 * self.tail_chars:
+            self.tail = self.tail[-self.tail_chars:]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_chars > self.head_size + len(self.trimmed_tail())
+
+    def trimmed_tail(self) -> str:
+        tail = self.tail[-self.tail_chars:]
+        lines = tail.split("\n")
+        # a trailing newline leaves an empty last item that is not a line of its own
+        keep = self.tail_lines + 1 if tail.endswith("\n") else self.tail_lines
+        return "\n".join(lines[-keep:]) if keep else ""
+
+    def text(self) -> str:
+        head = "".join(self.head)
+        if not self.full:
+            return head
+        tail = self.trimmed_tail()
+        omitted_chars = self.total_chars - len(head) - len(tail)
+        if omitted_chars <= 0:
+            return head + tail
+        omitted_lines = self.total_lines - head.count("\n") - tail.count("\n")
+        return f"{head}\n... [{omitted_lines} lines, {omitted_chars} characters omitted] ...\n{tail}"
+
+
+def pump(stream, capture: Capture, echo=None):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = stream.read1(CHUNK_SIZE) if hasattr(stream, "read1") else stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        capture.write(text)
+        if echo is not None:
+            echo(text)
+    text = decoder.decode(b"", final=True)
+    if text:
+        capture.write(text)
+    stream.close()
+
+
+def run(args: list, timeout: float = TIMEOUT, max_chars: int = MAX_CHARS, max_lines: int = MAX_LINES,
+        echo=None) -> dict:
+    """Run a command, streaming its output into bounded captures.
+
+    The command is killed early if the turn it runs for is cancelled.
+
+    Args:
+        args: The command and its arguments.
+        timeout: Seconds the command may run before it is killed.
+        max_chars: The characters of each stream to keep.
+        max_lines: The lines of each stream to keep.
+        echo: An optional callable that is given stdout text as it arrives.
+
+    Returns:
+        dict: The `exit_code`, `stdout`, `stderr`, whether the output was `truncated`, and whether it `timed_out`
+            or was `cancelled`.
+    """
+
+    stdout, stderr = Capture(max_chars, max_lines), Capture(max_chars, max_lines)
+    process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    readers = [
+        threading.Thread(target=pump, args=(process.stdout, stdout, echo), daemon=True),
+        threading.Thread(target=pump, args=(process.stderr, stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    turn = current_turn.get()
+    unregister = turn.on_cancel(process.kill) if turn is not None else None
+    timed_out = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        process.kill()
+        process.wait()
+    finally:
+        if unregister is not None:
+            unregister()
+    for reader in readers:
+        reader.join(timeout=1)
+
+    return {
+        "cancelled": turn is not None and turn.cancelled.is_set(),
+        "exit_code": process.returncode,
+        "stdout": stdout.text(),
+        "stderr": stderr.text(),
+        "truncated": stdout.truncated or stderr.truncated,
+        "timed_out": timed_out,
+    }
+
+
+# shared by every session in this process, so no more than WORKERS of its commands run at once
+pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="command")
+
+
+def submit(args: list, **kwargs):
+    """Queue a command on the shared pool.
+
+    Returns:
+        Future: Resolves to the result of `run`.
+    """
+
+    # copy the context so the command knows which turn it runs for
+    return pool.submit(contextvars.copy_context().run, run, args, **kwargs)
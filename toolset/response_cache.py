@@ -0,0 +1,203 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from toolset.telemetry import DURATIONS
+from toolset.web import CACHE_ROOT
+
+DEFAULT_PATH = CACHE_ROOT / "responses.sqlite3"
+
+# total size of stored responses before the least recently used are evicted
+MAX_BYTES = 256 * 1024 * 1024
+
+# request fields that do not change the response
+IGNORED = {"keep_alive", "stream"}
+
+MODES = ("readwrite", "replay")
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+def canonical(value):
+    """Convert a request value into plain JSON types, with tools and models as their schemas."""
+
+    if callable(value) and not isinstance(value, type):
+        from ollama._utils import convert_function_to_tool
+
+        value = convert_function_to_tool(value)
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    return value
+
+
+def joined(parts) -> str:
+    return "".join(part or "" for part in parts) or None
+
+
+def fold(kind: str, chunks: list):
+    """Fold the chunks of a streamed response into one response, like the same request without streaming."""
+
+    last = chunks[-1]
+    if kind == "chat":
+        message = last.message.model_copy(update={
+            "content": joined(chunk.message.content for chunk in chunks),
+            "thinking": joined(chunk.message.thinking for chunk in chunks),
+            # tool calls can arrive in any chunk
+            "tool_calls": [call for chunk in chunks for call in chunk.message.tool_calls or ()] or None,
+        })
+        return last.model_copy(update={"message": message})
+    return last.model_copy(update={
+        "response": joined(chunk.response for chunk in chunks) or "",
+        "thinking": joined(chunk.thinking for chunk in chunks),
+    })
+
+
+def deterministic(options) -> bool:
+    """Whether the options fix the sampling, so the same request always gets the same response."""
+
+    options = canonical(options) or {}
+    return options.get("temperature") == 0 or options.get("seed") is not None
+
+
+class ResponseCache:
+    """A content-addressed SQLite cache of chat and generate responses.
+
+    Requests are keyed by a hash of everything that affects the response: the
+    model, messages or prompt, tool schemas, format, and options. Only
+    deterministic requests, with `temperature=0` or a fixed `seed`, are cached.
+    A streamed request is stored folded into one response once its stream
+    ends, and a hit is streamed back as that single chunk.
+
+    Args:
+        path: The SQLite database file.
+        max_bytes: The total size of stored responses to evict down to.
+        mode: `readwrite` to call the model on a miss and store the response,
+            or `replay` to only read, raising `ReplayMiss` on a miss.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes: int = MAX_BYTES, mode: str = "readwrite"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if mode == "replay":
+            self.db = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, kind TEXT, body TEXT, size INTEGER, accessed REAL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.db.commit()
+
+    @staticmethod
+    def key(kind: str, request: dict) -> str:
+        request = {name: value for name, value in request.items() if name not in IGNORED}
+        body = json.dumps([kind, canonical(request)], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(body.encode()).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self.db.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.mode != "replay":
+                self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                self.db.commit()
+        return row[0] if row else None
+
+    def put(self, key: str, kind: str, body: str):
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, body, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, body, len(body), time.time()),
+            )
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # drop the least recently used responses until the rest fit
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY accessed")
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def call(self, kind: str, function, response_type, request: dict):
+        if not deterministic(request.get("options")):
+            return function(**request)
+
+        key = self.key(kind, request)
+        body = self.get(key)
+        if body is not None:
+            self.hits += 1
+            # the stored timings describe the original call, not this one
+            response = response_type.model_validate_json(body).model_copy(update={field: None for field in DURATIONS})
+            return iter([response]) if request.get("stream") else response
+
+        self.misses += 1
+        if self.mode == "replay":
+            raise ReplayMiss(f"No cached response for this {kind} request.")
+        if request.get("stream"):
+            return self.stream(key, kind, function(**request))
+        response = function(**request)
+        self.put(key, kind, response.model_dump_json(exclude_none=True))
+        return response
+
+    def stream(self, key: str, kind: str, chunks):
+        """Pass the chunks of a response on as they arrive, storing the folded response when the stream ends."""
+
+        seen = []
+        for chunk in chunks:
+            seen.append(chunk)
+            yield chunk
+        if seen and seen[-1].done:
+            self.put(key, kind, fold(kind, seen).model_dump_json(exclude_none=True))
+
+    def chat(self, client=None, **request):
+        """`ollama.chat`, answered from the cache when the same request was made before.
+
+        Args:
+            client: The `ollama.Client` to call on a miss, or the default client.
+            **request: The arguments of `ollama.chat`.
+        """
+
+        import ollama
+
+        return self.call("chat", (client or ollama).chat, ollama.ChatResponse, request)
+
+    def generate(self, client=None, **request):
+        """`ollama.generate`, answered from the cache when the same request was made before.
+
+        Args:
+            client: The `ollama.Client` to call on a miss, or the default client.
+            **request: The arguments of `ollama.generate`.
+        """
+
+        import ollama
+
+        return self.call("generate", (client or ollama).generate, ollama.GenerateResponse, request)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": size}
@@ -0,0 +1,109 @@
+import threading
+import time
+
+TIERS = ("small", "large")
+
+
+def invalid_calls(tool_calls, schemas: list) -> list:
+    """Check tool calls against the schemas of the enabled tools.
+
+    Args:
+        tool_calls: The tool calls of a response.
+        schemas: The `ollama.Tool` schemas the calls may use.
+
+    Returns:
+        list: A description of each problem, empty when every call is valid.
+    """
+
+    parameters = {schema.function.name: schema.function.parameters for schema in schemas}
+    problems = []
+    for tool_call in tool_calls:
+        name = tool_call.function.name
+        arguments = tool_call.function.arguments
+        if name not in parameters:
+            problems.append(f"{name} is not a tool")
+            continue
+        if not isinstance(arguments, dict):
+            problems.append(f"{name} was not given an object of arguments")
+            continue
+        known = set((parameters[name].properties or {}) if parameters[name] else ())
+        required = set((parameters[name].required or ()) if parameters[name] else ())
+        for argument in sorted(required - set(arguments)):
+            problems.append(f"{name} is missing {argument}")
+        for argument in sorted(set(arguments) - known):
+            problems.append(f"{name} has no argument {argument}")
+    return problems
+
+
+class Router:
+    """Send tool selection rounds to a small model and answers to a large one.
+
+    Each round is first given to the small model. When it only calls tools, and
+    every call is valid, its response is used. When it answers instead, or its
+    calls are invalid, the large model makes the round, so the user only reads
+    answers from the large model and a final round costs one extra small call.
+
+    Args:
+        small: The model that selects tools.
+        large: The model that writes answers, and makes the rounds the small model gets wrong.
+        tools: The `Toolset` whose enabled tools the calls are checked against.
+    """
+
+    def __init__(self, small: str, large: str, tools):
+        self.small = small
+        self.large = large
+        self.tools = tools
+        self.calls = {tier: 0 for tier in TIERS}
+        self.seconds = {tier: 0.0 for tier in TIERS}
+        self.used = {tier: 0 for tier in TIERS}
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def timed(self, tier: str, call):
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            with self._lock:
+                self.calls[tier] += 1
+                self.seconds[tier] += time.perf_counter() - start
+
+    def route(self, chat):
+        """Make a round of the tool loop on the right tier.
+
+        Args:
+            chat: A callable taking a model name and whether the reply is for the user,
+                to stream or print it, that makes the chat request and returns the response.
+
+        Returns:
+            The response to use for the round.
+        """
+
+        response = self.timed("small", lambda: chat(self.small, False))
+        message = response.message
+        if message.tool_calls and not message.content:
+            if not invalid_calls(message.tool_calls, self.tools.schemas):
+                with self._lock:
+                    self.used["small"] += 1
+                return response
+            with self._lock:
+                self.fallbacks += 1
+
+        response = self.timed("large", lambda: chat(self.large, True))
+        with self._lock:
+            self.used["large"] += 1
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                tier: {
+                    "model": getattr(self, tier),
+                    "calls": self.calls[tier],
+                    "rounds": self.used[tier],
+                    "mean_seconds": self.seconds[tier] / self.calls[tier] if self.calls[tier] else None,
+                }
+                for tier in TIERS
+            }
+            stats["fallbacks"] = self.fallbacks
+            return stats
@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+# seconds between background samples of each kind of host state
+DEFAULT_INTERVALS = {
+    "local_ip": 300,
+    "network_interfaces": 60,
+    "public_ip": 600,
+    "connections": 5,
+}
+
+DEFAULT_INTERVAL = 60
+
+
+def as_of(sampled_at: float) -> str:
+    """Format a sample time for tool results, e.g. '2024-05-01T12:00:00Z'."""
+
+    return datetime.fromtimestamp(sampled_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class HostSampler:
+    """Keep snapshots of host state in memory, refreshed in the background.
+
+    Each sample is a function taking no arguments. `get` returns the latest value
+    without waiting, unless it is older than its interval, e.g. before the
+    background thread is started, or a refresh is forced. Errors are kept like
+    values, so a failing sample is retried on the next interval instead of on
+    every call.
+
+    Args:
+        intervals: A mapping of sample names to seconds between refreshes, merged over `DEFAULT_INTERVALS`.
+    """
+
+    def __init__(self, intervals: dict = None):
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.functions = {}
+        self.samples = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, name: str, function):
+        with self._lock:
+            self.functions[name] = function
+            self._locks[name] = threading.Lock()
+
+    def interval(self, name: str) -> float:
+        return self.intervals.get(name, DEFAULT_INTERVAL)
+
+    def sample(self, name: str) -> dict:
+        """Take a new sample now.
+
+        Returns:
+            dict: The `value`, or the `error` raised, and when it was `sampled_at`.
+        """
+
+        with self._locks[name]:
+            try:
+                entry = {"value": self.functions[name](), "sampled_at": time.time()}
+            except Exception as e:
+                entry = {"error": str(e) or type(e).__name__, "sampled_at": time.time()}
+            with self._lock:
+                self.samples[name] = entry
+            return entry
+
+    def get(self, name: str, refresh: bool = False) -> dict:
+        """The latest sample, taken now if there is none within its interval or `refresh` is set.
+
+        Returns:
+            dict: The `value`, or the `error` raised, and when it was `sampled_at`.
+        """
+
+        with self._lock:
+            entry = self.samples.get(name)
+        if refresh or entry is None or time.time() - entry["sampled_at"] > self.interval(name):
+            entry = self.sample(name)
+        return entry
+
+    def due(self, now: float) -> list:
+        with self._lock:
+            return [
+                name for name in self.functions
+                if name not in self.samples or now - self.samples[name]["sampled_at"] >= self.interval(name)
+            ]
+
+    def run(self):
+        while not self._stopped.is_set():
+            for name in self.due(time.time()):
+                self.sample(name)
+            with self._lock:
+                waits = [
+                    self.samples[name]["sampled_at"] + self.interval(name) - time.time()
+                    for name in self.functions if name in self.samples
+                ]
+            self._stopped.wait(max(0.1, min(waits, default=DEFAULT_INTERVAL)))
+
+    def start(self):
+        """Sample everything now and keep refreshing on a background thread, unless it is already running."""
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self.run, name="host-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,178 @@
+import ipaddress
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from toolset.scheduler import current_turn
+
+# addresses sent in one srp call, a range is split evenly between the workers within these bounds
+MIN_CHUNK = 256
+MAX_CHUNK = 4096
+
+# chunks scanned at once
+WORKERS = 8
+
+# seconds a whole scan may take, retries included, inside handle_tool_calls' 30 second timeout
+DEADLINE = 25
+
+# seconds to wait for ARP replies, adapted to the replies seen so far, split between the attempts
+TIMEOUT = 2
+MIN_TIMEOUT = 0.5
+MAX_TIMEOUT = 5
+
+# seconds an attempt waits at least, a retry is skipped when less time is left
+MIN_ATTEMPT = 0.25
+
+# extra attempts for hosts that did not reply
+RETRIES = 1
+
+# seconds a scanned host, reachable or not, is kept before it is probed again
+TTL = 300
+
+
+def chunks(addresses: list, size: int) -> list:
+    return [addresses[i:i + size] for i in range(0, len(addresses), size)]
+
+
+class ArpScanner:
+    """Scan subnets with ARP requests in parallel chunks, caching the results per subnet.
+
+    Each host's result is kept for `ttl` seconds, so scanning a subnet again only
+    probes the hosts whose results have expired. The reply timeout adapts to the
+    round-trip times of the replies seen so far.
+
+    A scan, retries included, stops after `deadline` seconds, or sooner at the
+    deadline of the turn it runs for, and as soon as the turn is cancelled.
+    The hosts found so far are returned, and the hosts not probed yet are left
+    uncached, so scanning again continues with them.
+
+    Args:
+        ttl: Seconds to keep each host's result.
+        workers: The number of chunks scanned at once.
+        retries: Extra attempts for hosts that did not reply.
+        deadline: Seconds a scan may take, within the tool call timeout of `handle_tool_calls`.
+    """
+
+    def __init__(self, ttl: float = TTL, workers: int = WORKERS, retries: int = RETRIES, deadline: float = DEADLINE):
+        self.ttl = ttl
+        self.workers = workers
+        self.deadline = deadline
+        self.retries = retries
+        self.timeout = TIMEOUT
+        # subnet -> {ip: (checked at, mac or None)}
+        self.subnets = {}
+        self._lock = threading.Lock()
+
+    def probe(self, addresses: list, timeout: float) -> dict:
+        """Send one ARP request to each address.
+
+        Returns:
+            dict: The MAC address of each address that replied.
+        """
+
+        import scapy.all as scapy
+
+        request = scapy.Ether(dst="ff:ff:ff:ff:ff:ff") / scapy.ARP(pdst=addresses)
+        answered = scapy.srp(request, timeout=timeout, verbose=False)[0]
+
+        found = {}
+        rtts = []
+        for sent, received in answered:
+            found[received.psrc] = received.hwsrc
+            if getattr(sent, "sent_time", None):
+                rtts.append(received.time - sent.sent_time)
+        if rtts:
+            self.adapt(max(rtts))
+        return found
+
+    def adapt(self, rtt: float):
+        # wait a few times the slowest reply, smoothed so one outlier does not swing it
+        target = min(MAX_TIMEOUT, max(MIN_TIMEOUT, rtt * 4))
+        with self._lock:
+            self.timeout = 0.7 * self.timeout + 0.3 * target
+
+    def scan_chunk(self, addresses: list, deadline: float, turn=None):
+        """Probe a chunk, retrying the addresses that did not reply while there is time.
+
+        Returns:
+            tuple: The MAC address of each address that replied, and whether the chunk was probed at all.
+        """
+
+        found = {}
+        remaining = addresses
+        probed = False
+        for _ in range(1 + self.retries):
+            left = deadline - time.monotonic()
+            if not remaining or left < MIN_ATTEMPT or (turn is not None and turn.cancelled.is_set()):
+                break
+            # the attempts share the timeout, so retries resend lost requests without waiting longer overall
+            found.update(self.probe(remaining, min(left, max(MIN_ATTEMPT, self.timeout / (1 + self.retries)))))
+            probed = True
+            remaining = [address for address in remaining if address not in found]
+        return found, probed
+
+    def iter_scan(self, ip_range: str):
+        """Scan a range, yielding each device as soon as its chunk finishes.
+
+        Devices still cached from an earlier scan are yielded first.
+
+        Args:
+            ip_range: The subnet range to scan, e.g. '192.168.1.0/24'.
+
+        Yields:
+            dict: The IP and MAC address of a device.
+        """
+
+        network = ipaddress.ip_network(ip_range, strict=False)
+        addresses = [str(address) for address in (network.hosts() if network.num_addresses > 1 else [network.network_address])]
+        now = time.monotonic()
+        with self._lock:
+            cache = self.subnets.setdefault(str(network), {})
+            fresh = {ip: mac for ip, (checked, mac) in cache.items() if checked + self.ttl > now}
+        for ip, mac in fresh.items():
+            if mac is not None:
+                yield {"ip": ip, "mac": mac}
+
+        expired = [address for address in addresses if address not in fresh]
+        if not expired:
+            return
+
+        turn = current_turn.get()
+        deadline = time.monotonic() + self.deadline
+        if turn is not None:
+            deadline = min(deadline, turn.deadline)
+        size = min(MAX_CHUNK, max(MIN_CHUNK, math.ceil(len(expired) / self.workers)))
+        pending = chunks(expired, size)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(pending)), thread_name_prefix="arp") as pool:
+            futures = {pool.submit(self.scan_chunk, chunk, deadline, turn): chunk for chunk in pending}
+            while futures:
+                done, _ = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+                if turn is not None and turn.expired():
+                    # stop the chunks not started yet, the running ones stop at their next attempt
+                    for future in futures:
+                        future.cancel()
+                for future in done:
+                    chunk = futures.pop(future)
+                    found, probed = future.result()
+                    if probed:
+                        checked = time.monotonic()
+                        with self._lock:
+                            for address in chunk:
+                                cache[address] = (checked, found.get(address))
+                    for ip, mac in found.items():
+                        yield {"ip": ip, "mac": mac}
+                futures = {future: chunk for future, chunk in futures.items() if not future.cancelled()}
+
+    def scan(self, ip_range: str) -> list:
+        """Scan a range and return every device found, sorted by IP address."""
+
+        devices = list(self.iter_scan(ip_range))
+        return sorted(devices, key=lambda device: ipaddress.ip_address(device["ip"]))
+
+    def clear(self, ip_range: str = None):
+        with self._lock:
+            if ip_range is None:
+                self.subnets.clear()
+            else:
+                self.subnets.pop(str(ipaddress.ip_network(ip_range, strict=False)), None)
@@ -0,0 +1,232 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from toolset.slots import SLOT_DIR, HostSlots
+
+# calls of each tool that run at once across every process on this machine
+DEFAULT_LIMITS = {
+    "scan_network": 1,
+    "ping_sweep": 2,
+    "fetch_many": 2,
+    "subprocess_run_command": 4,
+}
+
+DEFAULT_LIMIT = 8
+
+# calls that may be queued or running at once in this process before new ones wait
+MAX_PENDING = 64
+
+# seconds of tool time a turn gets before its remaining calls are cancelled
+TURN_BUDGET = 60
+
+# seconds between checks for cancellation while a call waits for a slot
+POLL_INTERVAL = 0.1
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Busy(Exception):
+    pass
+
+
+class Turn:
+    """The deadline and cancellation state shared by the tool calls of one agent turn.
+
+    Tools can register a callback with `on_cancel` to stop work in flight, e.g. to
+    kill a subprocess, when the turn is cancelled.
+
+    Args:
+        budget: Seconds the turn's tool calls may take in total.
+    """
+
+    def __init__(self, budget: float = TURN_BUDGET):
+        self.deadline = time.monotonic() + budget
+        self.cancelled = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.cancelled.is_set() or self.remaining() <= 0
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled("The turn was cancelled.")
+        if self.remaining() <= 0:
+            raise Cancelled("The turn ran out of time.")
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Call `callback` when the turn is cancelled, or now if it already was.
+
+        Returns:
+            A function that unregisters the callback.
+        """
+
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+# the turn a tool call belongs to, set while the call runs
+current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+class Scheduler:
+    """Run tool calls on a shared pool with a concurrency limit per tool.
+
+    A call first takes one of `max_pending` places, which bounds the work queued
+    in this process. Calls beyond their tool's limit wait in a queue per tool,
+    in order, and the next one is handed to the pool when a call of that tool
+    finishes, so waiting calls never hold a worker and a slow tool cannot hold up
+    the others. Queued calls are dropped when their turn is cancelled or their
+    future is cancelled.
+
+    Each session is its own process, so the tools listed in `limits` also take a
+    `HostSlots` slot before they run, which holds their limit across every process
+    on the machine. A call waiting for another process's slot holds its worker.
+
+    Args:
+        limits: A mapping of tool names to concurrency limits, merged over `DEFAULT_LIMITS`.
+        default_limit: The concurrency limit of tools not listed in `limits`, in this process only.
+        max_pending: The calls that may be queued or running at once in this process.
+        workers: The threads running calls.
+        slot_dir: The directory of lock files the processes on this machine share their limits through.
+    """
+
+    def __init__(self, limits: dict = None, default_limit: int = DEFAULT_LIMIT, max_pending: int = MAX_PENDING,
+                 workers: int = 16, slot_dir=SLOT_DIR):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.default_limit = default_limit
+        self.slots = {name: HostSlots(f"tool-{name}", limit, slot_dir) for name, limit in self.limits.items()}
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+        self.running = {}
+        self.queues = {}
+        self._lock = threading.Lock()
+
+    def limit(self, name: str) -> int:
+        return self.limits.get(name, self.default_limit)
+
+    def acquire(self, semaphore: threading.Semaphore, turn: Turn) -> bool:
+        while not semaphore.acquire(timeout=min(POLL_INTERVAL, turn.remaining())):
+            if turn.expired():
+                return False
+        return True
+
+    def submit(self, name: str, function, turn: Turn) -> Future:
+        """Queue a call of the tool `name` for `turn`.
+
+        Args:
+            name: The name of the tool, which selects its concurrency limit.
+            function: A callable taking no arguments that makes the call.
+            turn: The turn the call belongs to.
+
+        Returns:
+            Future: Resolves to the result of `function`, or raises `Cancelled`.
+
+        Raises:
+            Busy: The turn ran out of time while waiting for a place in the queue.
+        """
+
+        if not self.acquire(self.pending, turn):
+            raise Busy("Too many tool calls are queued, try again later.")
+        future = Future()
+        call = (future, function, turn, contextvars.copy_context())
+        with self._lock:
+            if self.running.get(name, 0) < self.limit(name):
+                self.running[name] = self.running.get(name, 0) + 1
+                queued = False
+            else:
+                self.queues.setdefault(name, deque()).append(call)
+                queued = True
+        if queued:
+            future.add_done_callback(lambda _: self.discard(name, call))
+            turn.on_cancel(future.cancel)
+        else:
+            self.dispatch(name, call)
+        return future
+
+    def discard(self, name: str, call: tuple):
+        """Drop a call that was cancelled while it waited in its tool's queue."""
+
+        with self._lock:
+            queue = self.queues.get(name)
+            if not queue or call not in queue:
+                return
+            queue.remove(call)
+        self.pending.release()
+
+    def dispatch(self, name: str, call: tuple):
+        future, function, turn, context = call
+        try:
+            self.executor.submit(context.run, self.run, name, future, function, turn)
+        except BaseException as e:
+            self.finish(name)
+            future.set_exception(e)
+
+    def run(self, name: str, future: Future, function, turn: Turn):
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                turn.check()
+                held = self.slots[name].acquire(turn) if name in self.slots else None
+                if name in self.slots and held is None:
+                    raise Cancelled(f"The turn ran out of time waiting for another session's {name} calls.")
+                try:
+                    current_turn.set(turn)
+                    future.set_result(function())
+                finally:
+                    if held is not None:
+                        HostSlots.release(held)
+            except BaseException as e:
+                future.set_exception(e)
+        finally:
+            self.finish(name)
+
+    def finish(self, name: str):
+        """Release a call's place and hand its tool's slot to the next queued call, if any."""
+
+        self.pending.release()
+        with self._lock:
+            queue = self.queues.get(name)
+            while queue:
+                call = queue.popleft()
+                if call[0].cancelled():
+                    # its done callback found it already gone from the queue
+                    self.pending.release()
+                    continue
+                break
+            else:
+                self.running[name] -= 1
+                return
+        self.dispatch(name, call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {"running": count, "queued": len(self.queues.get(name, ()))}
+                for name, count in self.running.items() if count or self.queues.get(name)
+            }
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+
+from toolset.cache import ToolCache
+from toolset.web import CACHE_ROOT
+
+DEFAULT_PATH = CACHE_ROOT / "semantic"
+
+DEFAULT_MODEL = "nomic-embed-text"
+
+# cosine similarity above which two prompts are taken to ask the same question
+THRESHOLD = 0.92
+
+# answers kept before the least recently used are evicted
+CAPACITY = 1024
+
+# nearest stored prompts checked for one asked in the same context
+CANDIDATES = 8
+
+
+def context_key(context: str = None):
+    return hashlib.sha256(context.encode()).hexdigest() if context else None
+
+
+class SemanticCache:
+    """Answer prompts that closely paraphrase one answered before.
+
+    Prompts are embedded with the Ollama embed API and compared with the stored
+    prompts by cosine similarity. A stored answer is only reused while every tool
+    it relied on is within its TTL, and answers that relied on a tool that is never
+    cached, like the current time, are not stored at all.
+
+    A prompt is only matched with prompts asked in the same context, e.g. the
+    answer before it, so a follow-up like "why?" never gets the answer to a
+    follow-up in another conversation. Prompts without context, like the first
+    of a conversation, match each other by meaning alone.
+
+    Args:
+        model: The embedding model.
+        host: The Ollama host to embed with, or the default host.
+        client: A client to embed with instead, e.g. a `ClientPool` session.
+        path: The directory to keep the vector store in.
+        capacity: The answers kept before the least recently used are evicted.
+        threshold: The cosine similarity a stored prompt needs to be a match.
+        ttls: A function giving the TTL in seconds of a tool by name, e.g. `ToolCache.ttl`.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, host: str = None, client=None, path=DEFAULT_PATH,
+                 capacity: int = CAPACITY, threshold: float = THRESHOLD, ttls=None):
+        import ollama
+
+        # numpy is slow to import, so only pay for it when a semantic cache is made
+        from toolset.vectors import VectorStore
+
+        self.model = model
+        self.client = client or ollama.Client(host=host)
+        self.store = VectorStore(path, capacity)
+        self.threshold = threshold
+        self.ttls = ttls or ToolCache().ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._last = None
+        self._lock = threading.Lock()
+
+    def embed(self, text: str):
+        with self._lock:
+            if self._last is not None and self._last[0] == text:
+                return self._last[1]
+        vector = self.client.embed(model=self.model, input=text).embeddings[0]
+        with self._lock:
+            self._last = (text, vector)
+        return vector
+
+    def fresh(self, item: dict, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        return all(now < used + self.ttls(name) for name, used in item["tools"].items())
+
+    def lookup(self, prompt: str, context: str = None):
+        """Find the answer to a prompt like this one, asked in the same context.
+
+        Args:
+            prompt: The user's prompt.
+            context: What the prompt may refer to, e.g. the previous answer, or None if it stands alone.
+
+        Returns:
+            str: The stored answer, or None if no stored prompt is similar enough or its tools are stale.
+        """
+
+        key = context_key(context)
+        matches = [
+            match for match in self.store.search(self.embed(prompt), k=CANDIDATES)
+            if match[0] >= self.threshold and match[2].get("context") == key
+        ]
+        if matches:
+            score, slot, item = matches[0]
+            if self.fresh(item):
+                self.store.touch(slot)
+                self.hits += 1
+                return item["answer"]
+            # the tool results behind the answer are out of date, so a new answer replaces it
+            self.store.remove(slot)
+            self.stale += 1
+        self.misses += 1
+        return None
+
+    def add(self, prompt: str, answer: str, tools=(), context: str = None) -> bool:
+        """Store the answer to a prompt.
+
+        Args:
+            prompt: The user's prompt.
+            answer: The final answer to it.
+            tools: The names of the tools called to answer it.
+            context: The context the prompt was asked in, as given to `lookup`.
+
+        Returns:
+            bool: Whether the answer was stored.
+        """
+
+        now = time.time()
+        if any(self.ttls(name) <= 0 for name in tools):
+            return False
+        item = {
+            "prompt": prompt,
+            "answer": answer,
+            "tools": {name: now for name in tools},
+            "context": context_key(context),
+            "created": now,
+        }
+        self.store.add(self.embed(prompt), item)
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.store),
+        }
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+
+from toolset.history import estimate_tokens
+
+# context sizes to choose from, each a separate model load on the server
+BUCKETS = (2048, 4096, 8192, 16384, 32768)
+
+# prompt tokens processed per batch for each context size, larger batches prefill long prompts faster
+BATCH_SIZES = {2048: 512, 4096: 512, 8192: 1024, 16384: 1024, 32768: 2048}
+
+# tokens kept free for the reply
+RESERVE = 512
+
+# requests in a row that must fit a smaller context before shrinking to it, since each change reloads the model
+SHRINK_AFTER = 8
+
+# a smaller context only counts as fitting while the prompt uses at most this share of it
+SHRINK_FILL = 0.75
+
+
+class ContextSizer:
+    """Choose `num_ctx` and `num_batch` for each request from a local estimate of the prompt.
+
+    The smallest bucket that holds the prompt and the reply is used. A model's
+    context grows as soon as a prompt needs it, but only shrinks after
+    `shrink_after` requests in a row fit comfortably in a smaller one, since every
+    change of size makes the server reload the model.
+
+    Args:
+        buckets: The context sizes to choose from.
+        max_ctx: The largest context to use, e.g. the model's limit. Budget the history against it.
+        reserve: Tokens kept free for the reply.
+        shrink_after: Requests in a row that must fit a smaller bucket before shrinking.
+        telemetry: An optional `Telemetry` to record each change of size to.
+    """
+
+    def __init__(self, buckets: tuple = BUCKETS, max_ctx: int = None, reserve: int = RESERVE,
+                 shrink_after: int = SHRINK_AFTER, telemetry=None):
+        self.buckets = sorted(buckets)
+        if max_ctx is not None:
+            self.buckets = [bucket for bucket in self.buckets if bucket < max_ctx] + [max_ctx]
+        self.reserve = reserve
+        self.shrink_after = shrink_after
+        self.telemetry = telemetry
+        self.current = {}
+        self.fits_smaller = {}
+        self.changes = 0
+        self.choices = {}
+        self._tools = (None, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def max_ctx(self) -> int:
+        return self.buckets[-1]
+
+    def tool_tokens(self, tools) -> int:
+        # the schemas of a Toolset are the same list until it changes, so estimate them once
+        if not tools:
+            return 0
+        if self._tools[0] is not tools:
+            schemas = [tool.model_dump(exclude_none=True) if hasattr(tool, "model_dump") else tool for tool in tools]
+            self._tools = (tools, estimate_tokens({"content": json.dumps(schemas, default=str)}))
+        return self._tools[1]
+
+    def estimate(self, messages: list, tools=None) -> int:
+        """The tokens a request needs, the prompt and tool schemas plus the reply."""
+
+        return sum(estimate_tokens(message) for message in messages) + self.tool_tokens(tools) + self.reserve
+
+    def fit(self, tokens: int) -> int:
+        return next((bucket for bucket in self.buckets if tokens <= bucket), self.max_ctx)
+
+    def choose(self, model: str, messages: list, tools=None) -> dict:
+        """Choose the context size of a request to `model`.
+
+        Returns:
+            dict: The `num_ctx` and `num_batch` to send.
+        """
+
+        tokens = self.estimate(messages, tools)
+        needed = self.fit(tokens)
+        with self._lock:
+            current = self.current.get(model)
+            chosen = current
+            if current is None or needed > current:
+                chosen = needed
+                self.fits_smaller[model] = 0
+            elif needed < current and tokens <= needed * SHRINK_FILL:
+                self.fits_smaller[model] = self.fits_smaller.get(model, 0) + 1
+                if self.fits_smaller[model] >= self.shrink_after:
+                    chosen = needed
+                    self.fits_smaller[model] = 0
+            else:
+                self.fits_smaller[model] = 0
+
+            self.current[model] = chosen
+            self.choices[chosen] = self.choices.get(chosen, 0) + 1
+            changed = chosen != current
+            if changed and current is not None:
+                self.changes += 1
+
+        if changed and self.telemetry is not None:
+            self.telemetry.write({
+                "type": "context",
+                "time": time.time(),
+                "model": model,
+                "tokens": tokens,
+                "from": current,
+                "num_ctx": chosen,
+            })
+        return {"num_ctx": chosen, "num_batch": BATCH_SIZES.get(chosen)}
+
+    def smallest(self) -> dict:
+        """The `num_ctx` and `num_batch` of the smallest bucket, e.g. to preload a model with before any request."""
+
+        return {"num_ctx": self.buckets[0], "num_batch": BATCH_SIZES.get(self.buckets[0])}
+
+    def apply(self, options, model: str, messages: list, tools=None):
+        """A copy of `options` with the context size chosen for this request.
+
+        Returns:
+            The options to send, an `ollama.Options` or a dict like the ones given.
+        """
+
+        sizes = self.choose(model, messages, tools)
+        if hasattr(options, "model_copy"):
+            return options.model_copy(update=sizes)
+        return {**(options or {}), **sizes}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"current": dict(self.current), "changes": self.changes, "choices": dict(self.choices)}
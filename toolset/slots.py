@@ -0,0 +1,73 @@
+try:
+    import fcntl
+except ImportError:
+    # no flock on Windows, slots there only bound the calls of one process
+    fcntl = None
+
+from toolset.web import CACHE_ROOT
+
+# where the processes on this machine hold their slots
+SLOT_DIR = CACHE_ROOT / "slots"
+
+# seconds between tries while every slot is held
+POLL_INTERVAL = 0.1
+
+# what `acquire` holds where slots cannot be locked
+UNLOCKED = object()
+
+
+class HostSlots:
+    """Let at most `count` holders at once across every process on this machine.
+
+    Each slot is a lock file held with `flock`, so the sessions of separate
+    `demo.py` and `chat_tools.py` processes share one limit, and a slot is freed
+    when its holder closes it or its process exits, even by crashing.
+
+    Args:
+        name: The name of the limit, shared by every process using it.
+        count: The holders allowed at once.
+        slot_dir: The directory of lock files shared by the processes on this machine.
+    """
+
+    def __init__(self, name: str, count: int, slot_dir=SLOT_DIR):
+        self.name = name
+        self.count = count
+        self.slot_dir = slot_dir
+
+    def try_acquire(self):
+        """Take a free slot without waiting.
+
+        Returns:
+            The held slot to give to `release`, or None if every slot is held.
+        """
+
+        if fcntl is None:
+            return UNLOCKED
+        self.slot_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(self.count):
+            file = open(self.slot_dir / f"{self.name}-{i}.lock", "a")
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return file
+            except OSError:
+                file.close()
+        return None
+
+    def acquire(self, turn):
+        """Wait for a free slot while `turn` has time left.
+
+        Returns:
+            The held slot to give to `release`, or None if the turn expired first.
+        """
+
+        while True:
+            held = self.try_acquire()
+            if held is not None or turn.expired():
+                return held
+            turn.cancelled.wait(min(POLL_INTERVAL, turn.remaining()))
+
+    @staticmethod
+    def release(held):
+        if held is not UNLOCKED:
+            # closing the file drops its lock
+            held.close()
@@ -1,6 +1,8 @@
 import datetime
 import shlex
-import subprocess
+
+from toolset import process
+from toolset.scheduler import Cancelled
 
 BLOCKLIST = {
     "rm", "mv", "cp", "chmod", "chown", "dd", "kill", "reboot", "shutdown", "systemctl", "service",
@@ -24,7 +26,12 @@ def subprocess_run_command(command: str) -> str:
         command: Complete command to run, as it would be entered in the terminal
 
     Returns:
-        str: The text that is printed to stdout
+        str: The text that is printed to stdout, followed by stderr and the exit code if the command failed.
+            Long output keeps its first and last lines, with the middle omitted.
+
+    Raises:
+        Cancelled: If the turn was cancelled while the command ran.
+        process.TimedOut: If the command was killed for running too long, with its output so far.
     """
 
     print(f"Running {command}")
@@ -39,13 +46,22 @@ def subprocess_run_command(command: str) -> str:
     elif args[0].lower() == "echo" and any(arg in BLOCKLIST for arg in args[1:]):
         return f"Error: Command '{args[0]}' is not allowed."
     try:
-        res = subprocess.run(args, capture_output=True, text=True, timeout=5).stdout
+        res = process.submit(args, echo=lambda text: print(text, end="")).result()
     except Exception as e:
         print(f"Error: {e}")
         return str(e)
-    print(res)
-    return res
 
+    output = res["stdout"]
+    if res["stderr"]:
+        output += f"\n[stderr]\n{res['stderr']}"
+    # partial output is raised rather than returned, so it is never cached as the command's result
+    if res["cancelled"]:
+        raise Cancelled("The turn was cancelled.")
+    if res["timed_out"]:
+        raise process.TimedOut(f"Timed out after {process.TIMEOUT} seconds, the output so far:\n{output}")
+    if res["exit_code"] != 0:
+        output += f"\n[exit code {res['exit_code']}]"
+    return output
 
 
 def get_current_date_time() -> str:
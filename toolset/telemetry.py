@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# durations ollama reports in nanoseconds
+DURATIONS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+
+COUNTS = ("prompt_eval_count", "eval_count")
+
+# a call that spends longer than this loading the model is counted as a cold load
+COLD_LOAD_SECONDS = 0.5
+
+
+def timings(response, cold_load_seconds: float = COLD_LOAD_SECONDS) -> dict:
+    """Extract the timing fields of a chat or generate response.
+
+    Durations are converted to seconds, and prefill and decode throughput are
+    derived from the token counts.
+
+    Args:
+        response: A `ChatResponse` or `GenerateResponse`, or the final chunk of a stream.
+        cold_load_seconds: The load time above which the call counts as a cold load.
+
+    Returns:
+        dict: The durations in seconds, token counts, tokens per second, and whether the load was cold.
+    """
+
+    record = {"model": getattr(response, "model", None)}
+    for field in DURATIONS:
+        record[field] = (getattr(response, field, None) or 0) / 1e9
+    for field in COUNTS:
+        record[field] = getattr(response, field, None) or 0
+    record["prefill_tokens_per_second"] = (
+        record["prompt_eval_count"] / record["prompt_eval_duration"] if record["prompt_eval_duration"] else 0.0
+    )
+    record["decode_tokens_per_second"] = (
+        record["eval_count"] / record["eval_duration"] if record["eval_duration"] else 0.0
+    )
+    record["cold"] = record["load_duration"] > cold_load_seconds
+    return record
+
+
+class Telemetry:
+    """Record timings for every LLM call and agent turn.
+
+    Each record is appended to a JSONL file, if one is given, and added to running
+    totals that can be exported in the Prometheus text format.
+
+    Args:
+        path: An optional JSONL file to append records to.
+        cold_load_seconds: The load time above which a call counts as a cold load.
+    """
+
+    def __init__(self, path: str = None, cold_load_seconds: float = COLD_LOAD_SECONDS):
+        self.path = path
+        self.cold_load_seconds = cold_load_seconds
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.turn = None
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        if self.path is None:
+            return
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def record(self, response, kind: str = "chat") -> dict:
+        """Record the timings of an LLM call.
+
+        Args:
+            response: The response of the call, or the final chunk of a stream.
+            kind: The kind of call, e.g. `chat` or `generate`.
+
+        Returns:
+            dict: The record that was written.
+        """
+
+        record = {"type": "call", "kind": kind, "time": time.time(), **timings(response, self.cold_load_seconds)}
+        labels = (("kind", kind), ("model", record["model"]), ("load", "cold" if record["cold"] else "warm"))
+        with self._lock:
+            self.counters[("ollama_calls_total", labels)] += 1
+            for field in DURATIONS:
+                self.counters[(f"ollama_{field}_seconds_total", labels)] += record[field]
+            for field in COUNTS:
+                self.counters[(f"ollama_{field}_total", labels)] += record[field]
+            model = (("model", record["model"]),)
+            self.gauges[("ollama_prefill_tokens_per_second", model)] = record["prefill_tokens_per_second"]
+            self.gauges[("ollama_decode_tokens_per_second", model)] = record["decode_tokens_per_second"]
+            if self.turn is not None:
+                self.turn["calls"] += 1
+                self.turn["cold"] = self.turn["cold"] or record["cold"]
+                for field in DURATIONS + COUNTS:
+                    self.turn[field] += record[field]
+        self.write(record)
+        return record
+
+    def start_turn(self, turn: int):
+        with self._lock:
+            self.turn = {
+                "type": "turn",
+                "turn": turn,
+                "time": time.time(),
+                "started": time.perf_counter(),
+                "calls": 0,
+                "cold": False,
+                **{field: 0 for field in DURATIONS + COUNTS},
+            }
+
+    def end_turn(self) -> dict:
+        """Finish the current turn and record its totals.
+
+        Returns:
+            dict: The record of the turn, including its wall-clock time.
+        """
+
+        with self._lock:
+            record, self.turn = self.turn, None
+            if record is None:
+                return {}
+            record["wall_seconds"] = time.perf_counter() - record.pop("started")
+            labels = (("load", "cold" if record["cold"] else "warm"),)
+            self.counters[("agent_turns_total", labels)] += 1
+            self.counters[("agent_turn_seconds_total", labels)] += record["wall_seconds"]
+            self.counters[("agent_turn_calls_total", labels)] += record["calls"]
+        self.write(record)
+        return record
+
+    def prometheus(self) -> str:
+        """Render the totals in the Prometheus text exposition format."""
+
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                seen = set()
+                for (name, labels), value in sorted(metrics.items(), key=lambda item: str(item[0])):
+                    if name not in seen:
+                        lines.append(f"# TYPE {name} {kind}")
+                        seen.add(name)
+                    label = ",".join(f'{key}="{label_value}"' for key, label_value in labels)
+                    lines.append(f"{name}{{{label}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the Prometheus text at `/metrics` from a background thread.
+
+        Returns:
+            ThreadingHTTPServer: The running server, call `shutdown()` to stop it.
+        """
+
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,114 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# the spans open in the current context, innermost last
+_stack = contextvars.ContextVar("stack", default=())
+
+
+class Tracer:
+    """Collect nested timing spans and export them for trace viewers.
+
+    Spans nest through a context variable, so a span opened in a worker thread
+    is a child of the span that submitted the work when the context is copied
+    over with `contextvars.copy_context().run`.
+
+    Args:
+        enabled: Whether spans are recorded. A disabled tracer costs almost nothing.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.events = []
+        self.epoch = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """Time the enclosed block as a span.
+
+        Args:
+            name: The name of the span.
+            **args: Details shown with the span in the trace viewer.
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        # [name, time spent in children]
+        frame = [name, 0.0]
+        parents = _stack.get()
+        token = _stack.set(parents + (frame,))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            _stack.reset(token)
+            with self._lock:
+                if parents:
+                    parents[-1][1] += duration
+                self.events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.epoch) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": {key: str(value) for key, value in args.items()},
+                    "stack": [parent[0] for parent in parents] + [name],
+                    "self": max(0.0, duration - frame[1]),
+                })
+
+    def chrome_trace(self) -> dict:
+        """The spans in the Chrome trace event format, for chrome://tracing or Perfetto."""
+
+        with self._lock:
+            events = [{key: value for key, value in event.items() if key not in ("stack", "self")} for event in self.events]
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in {event["tid"] for event in events}:
+            events.append({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "tid": tid,
+                "args": {"name": threads.get(tid, str(tid))},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def collapsed(self) -> str:
+        """The spans as collapsed stacks, for flamegraph.pl or speedscope.
+
+        Each line is a semicolon separated stack followed by its self time in microseconds.
+        """
+
+        totals = defaultdict(float)
+        with self._lock:
+            for event in self.events:
+                totals[";".join(event["stack"])] += event["self"] * 1e6
+        return "\n".join(f"{stack} {round(value)}" for stack, value in sorted(totals.items())) + "\n"
+
+    def export_chrome(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def export_collapsed(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+
+
+# shared by the toolset, enable it to start recording
+tracer = Tracer(enabled=False)
+
+
+def span(name: str, **args):
+    return tracer.span(name, **args)
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+class VectorStore:
+    """A fixed-capacity store of unit vectors in a memory-mapped file, with an item per vector.
+
+    Vectors are normalized when added, so a search is a single matrix-vector
+    product giving cosine similarities. When the store is full, the least recently
+    used vector is replaced. The vectors live in `vectors.npy` and the items and
+    usage times in `items.json`, both under `path`.
+
+    Args:
+        path: The directory to keep the store in.
+        capacity: The most vectors kept.
+    """
+
+    def __init__(self, path, capacity: int = 1024):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.vectors = None
+        self.items = [None] * capacity
+        self.used = np.zeros(capacity, dtype=bool)
+        self.last_used = np.zeros(capacity)
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def vectors_file(self) -> Path:
+        return self.path / "vectors.npy"
+
+    @property
+    def items_file(self) -> Path:
+        return self.path / "items.json"
+
+    def load(self):
+        if not self.vectors_file.exists() or not self.items_file.exists():
+            return
+        vectors = np.lib.format.open_memmap(self.vectors_file, mode="r+")
+        if vectors.shape[0] != self.capacity:
+            return
+        self.vectors = vectors
+        state = json.loads(self.items_file.read_text())
+        for i, (item, last_used) in enumerate(zip(state["items"], state["last_used"])):
+            self.items[i] = item
+            self.used[i] = item is not None
+            self.last_used[i] = last_used
+
+    def save(self):
+        self.vectors.flush()
+        tmp = self.items_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"items": self.items, "last_used": self.last_used.tolist()}))
+        tmp.replace(self.items_file)
+
+    def __len__(self) -> int:
+        return int(self.used.sum())
+
+    def add(self, vector, item) -> int:
+        """Store a vector with its item, replacing the least recently used when full.
+
+        Returns:
+            int: The slot the vector was stored in.
+        """
+
+        return self.add_many([vector], [item])[0]
+
+    def add_many(self, vectors, items) -> list:
+        """Store vectors with their items, saving once for all of them.
+
+        Returns:
+            list: The slot each vector was stored in.
+        """
+
+        slots = []
+        with self._lock:
+            for vector, item in zip(vectors, items):
+                vector = np.asarray(vector, dtype=np.float32)
+                if self.vectors is None or self.vectors.shape[1] != vector.shape[0]:
+                    # the first vector, or a new embedding model, sets the dimension
+                    self.path.mkdir(parents=True, exist_ok=True)
+                    self.vectors = np.lib.format.open_memmap(
+                        self.vectors_file, mode="w+", dtype=np.float32, shape=(self.capacity, vector.shape[0]),
+                    )
+                    self.items = [None] * self.capacity
+                    self.used[:] = False
+                free = np.flatnonzero(~self.used)
+                slot = int(free[0]) if free.size else int(np.argmin(self.last_used))
+                norm = np.linalg.norm(vector)
+                self.vectors[slot] = vector / norm if norm else vector
+                self.items[slot] = item
+                self.used[slot] = True
+                self.last_used[slot] = time.time()
+                slots.append(slot)
+            if slots:
+                self.save()
+        return slots
+
+    def search(self, vector, k: int = 1) -> list:
+        """Find the stored vectors most similar to `vector`.
+
+        Returns:
+            list: Up to `k` tuples of cosine similarity, slot, and item, most similar first.
+        """
+
+        with self._lock:
+            if self.vectors is None or not self.used.any():
+                return []
+            vector = np.asarray(vector, dtype=np.float32)
+            if vector.shape[0] != self.vectors.shape[1]:
+                return []
+            norm = np.linalg.norm(vector)
+            scores = self.vectors @ (vector / norm if norm else vector)
+            scores[~self.used] = -np.inf
+            k = min(k, int(self.used.sum()))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), int(i), self.items[i]) for i in top]
+
+    def touch(self, slot: int):
+        with self._lock:
+            self.last_used[slot] = time.time()
+
+    def remove(self, slot: int):
+        with self._lock:
+            self.items[slot] = None
+            self.used[slot] = False
+            self.save()
@@ -0,0 +1,356 @@
+import codecs
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urlsplit
+
+CACHE_ROOT = Path(os.environ.get("ML_LM_CACHE_DIR", Path.home() / ".cache" / "ml-lm"))
+
+CACHE_DIR = CACHE_ROOT / "web"
+
+# total size of cached pages before the least recently used are evicted
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# stop reading a response after this many bytes
+MAX_BYTES = 2 * 1024 * 1024
+
+# stop reading a response once this much text has been extracted
+MAX_CHARS = 20_000
+
+TIMEOUT = 10
+
+USER_AGENT = "ml-lm/0.1"
+
+# requests fetch_many makes to one host at a time
+HOST_LIMIT = 4
+
+# seconds fetch_many waits for all pages before giving up on the rest
+DEADLINE = 20
+
+# elements whose content is not page text
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+# elements that start a new line of text
+BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article", "header", "footer",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "title", "dt", "dd",
+}
+
+
+class TextExtractor(HTMLParser):
+    """Extract readable text from HTML that is fed to it in pieces."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.length = 0
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping and data.strip():
+            self.parts.append(data)
+            self.length += len(data)
+
+    def text(self) -> str:
+        text = re.sub(r"[ \t\r\f\v]+", " ", "".join(self.parts))
+        return re.sub(r"\s*\n\s*", "\n", text).strip()
+
+
+class HTTPCache:
+    """An on-disk cache of fetched pages, keyed by URL.
+
+    Entries keep the validators the server sent, so a repeat fetch can be a
+    conditional request that the server answers with `304 Not Modified`. Once
+    the entries take more than `max_bytes`, the least recently used are evicted.
+
+    Args:
+        path: The directory to store entries in.
+        max_bytes: The total size of entries to evict down to.
+    """
+
+    def __init__(self, path: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # the size of the entries, counted on the first write and kept up to date after
+        self.size = None
+        self._lock = threading.Lock()
+
+    def file(self, url: str) -> Path:
+        return self.path / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str):
+        file = self.file(url)
+        try:
+            entry = json.loads(file.read_text())
+        except (OSError, ValueError):
+            return None
+        try:
+            # the modification time is when the entry was last used
+            os.utime(file)
+        except OSError:
+            pass
+        return entry
+
+    def set(self, url: str, entry: dict):
+        self.path.mkdir(parents=True, exist_ok=True)
+        file = self.file(url)
+        body = json.dumps(entry)
+        tmp = file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(body)
+        with self._lock:
+            if self.size is None:
+                self.size = sum(path.stat().st_size for path in self.entries())
+            try:
+                self.size -= file.stat().st_size
+            except OSError:
+                pass
+            tmp.replace(file)
+            self.size += len(body.encode())
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def entries(self) -> list:
+        try:
+            return list(self.path.glob("*.json"))
+        except OSError:
+            return []
+
+    def evict(self):
+        # other sessions share the directory, so count it again instead of trusting `size`
+        stats = []
+        for file in self.entries():
+            try:
+                stats.append((file.stat(), file))
+            except OSError:
+                continue
+        self.size = sum(stat.st_size for stat, _ in stats)
+        # drop the least recently used entries until the rest fit
+        for stat, file in sorted(stats, key=lambda item: item[0].st_mtime):
+            if self.size <= self.max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            self.size -= stat.st_size
+
+
+def max_age(headers) -> float:
+    """The seconds a response may be reused without revalidating, from its Cache-Control header."""
+
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else 0
+
+
+def read_text(response, max_bytes: int = MAX_BYTES, max_chars: int = MAX_CHARS) -> tuple:
+    """Read a streamed response, extracting text as it arrives.
+
+    Reading stops as soon as either limit is reached, so a large page is never downloaded in full.
+
+    Returns:
+        tuple: The text and whether it was truncated.
+    """
+
+    content_type = response.headers.get("Content-Type", "text/html").lower()
+    html = "html" in content_type
+    encoding = response.encoding if "charset" in content_type else "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    extractor = TextExtractor()
+    parts = []
+    length = 0
+    received = 0
+    truncated = False
+    for chunk in response.iter_content(chunk_size=16384):
+        received += len(chunk)
+        data = decoder.decode(chunk)
+        if html:
+            extractor.feed(data)
+            length = extractor.length
+        else:
+            parts.append(data)
+            length += len(data)
+        if received >= max_bytes or length >= max_chars:
+            truncated = True
+            break
+    response.close()
+
+    if html:
+        extractor.close()
+        text = extractor.text()
+    else:
+        text = "".join(parts)
+    if len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    return text, truncated
+
+
+def make_session(pool_size: int = 16):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+# shared so repeat requests to a host reuse its open connections,
+# created on first use so importing the toolset does not import requests
+session = None
+session_lock = threading.Lock()
+
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            session = make_session()
+        return session
+
+# runs blocking fetches for fetch_many, sized to the connection pool
+executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="fetch")
+
+cache = HTTPCache()
+
+
+def fetch_url(url: str) -> str:
+    """Fetch a web page and return its readable text.
+
+    Note:
+        Scripts, styles, and markup are removed. Long pages are cut off,
+        and end with `[truncated]` when they are.
+
+    Examples:
+        >>> fetch_url("https://www.python.org/downloads/")
+        Download Python | Python.org ...
+
+    Args:
+        url: The full URL of the page, including http:// or https://
+
+    Returns:
+        str: The text of the page
+    """
+
+    print(f"Requesting {url}")
+
+    entry = cache.get(url)
+    if entry is not None and entry.get("expires", 0) > time.time():
+        return entry["text"]
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    if response.status_code == 304 and entry is not None:
+        response.close()
+        entry["expires"] = time.time() + max_age(response.headers)
+        cache.set(url, entry)
+        return entry["text"]
+    response.raise_for_status()
+
+    text, truncated = read_text(response)
+    if truncated:
+        text += "\n[truncated]"
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    expires = time.time() + max_age(response.headers)
+    if etag or last_modified or expires > time.time():
+        cache.set(url, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires": expires,
+            "text": text,
+        })
+    return text
+
+
+async def fetch_all(urls: list, host_limit: int = HOST_LIMIT, deadline: float = DEADLINE) -> list:
+    """Fetch URLs concurrently, at most `host_limit` at a time per host.
+
+    Fetches still running at the deadline are abandoned and reported as errors.
+
+    Returns:
+        list: A dictionary per URL, in the same order, with its `text` or an `error`.
+    """
+
+    import asyncio
+
+    if not urls:
+        # asyncio.wait refuses an empty set of tasks
+        return []
+    loop = asyncio.get_running_loop()
+    semaphores = defaultdict(lambda: asyncio.Semaphore(host_limit))
+
+    async def fetch(url):
+        async with semaphores[urlsplit(url).netloc]:
+            return await loop.run_in_executor(executor, fetch_url, url)
+
+    tasks = [asyncio.create_task(fetch(url)) for url in urls]
+    _, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+
+    results = []
+    for url, task in zip(urls, tasks):
+        if task in pending:
+            results.append({"url": url, "error": f"Not fetched within {deadline} seconds."})
+        elif task.exception() is not None:
+            error = task.exception()
+            results.append({"url": url, "error": f"{type(error).__name__}: {error}"})
+        else:
+            results.append({"url": url, "text": task.result()})
+    return results
+
+
+def fetch_many(urls: list[str]) -> list:
+    """Fetch several web pages at once and return the readable text of each.
+
+    Note:
+        Use this instead of several calls to `fetch_url` when more than one page is needed.
+        Pages that fail or take too long have an `error` instead of `text`.
+
+    Examples:
+        >>> fetch_many(["https://docs.python.org/3/", "https://pypi.org/"])
+        [{"url": "https://docs.python.org/3/", "text": "..."}, {"url": "https://pypi.org/", "text": "..."}]
+
+    Args:
+        urls: The full URLs of the pages, including http:// or https://
+
+    Returns:
+        list: A dictionary per URL with the `url` and its `text` or an `error`
+    """
+
+    import asyncio
+
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return []
+    return asyncio.run(fetch_all(urls))